@@ -30,7 +30,13 @@ def main():
         client = DagsterGraphQLClient("localhost", port_number=DAGSTER_PORT)
         variables = {
             "backfillParams": {
-                "assetSelection": [{"path": "embeddings"}, {"path": "vector_index"}],
+                "assetSelection": [
+                    {"path": "embeddings"},
+                    {"path": "payloads"},
+                    {"path": "vector_index"},
+                    {"path": "lexical_index"},
+                    {"path": "collection_alias"},
+                ],
                 "allPartitions": True,
             }
         }
@@ -0,0 +1,15 @@
+"""Gunicorn settings for the backend container.
+
+The app is imported once in the master and workers are forked from it, so imports, tokenizers and
+other read-only state are shared copy-on-write. ONNX sessions are created per worker in the app
+lifespan since their thread pools don't survive a fork.
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '80')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+timeout = 60
+graceful_timeout = 30
@@ -0,0 +1,406 @@
+"""Load test the search API end to end and report latency percentiles and throughput per stage.
+
+Runs the backend app in process against an in-memory Qdrant seeded from `pipeline/seeds/transcripts`,
+with tiny randomly initialised stand-in ONNX models, so no network, GPU or model downloads are needed.
+Absolute numbers are not production numbers, but the serving path (batching, caches, pools, ranker
+bucketing) is the real one, so runs are comparable across commits:
+
+    uv run --group bench scripts/benchmark.py --concurrency 1 8 32 --requests 500 --output bench.json
+
+With `--index qdrant embedded` (the default) each level runs against Qdrant and then against the
+embedded in-process index built from the same vectors. Results are written as JSON: per index and
+concurrency level the throughput, client latency and the p50/p95/p99 of every stage reported in the
+Server-Timing header, plus the mean of the inference stages timed inside the inference executor.
+"""
+
+import argparse
+import asyncio
+import base64
+import csv
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import onnx
+from onnx import TensorProto, helper, numpy_helper
+from tokenizers import Tokenizer
+from tokenizers.models import WordPiece
+from tokenizers.normalizers import BertNormalizer
+from tokenizers.pre_tokenizers import BertPreTokenizer
+from tokenizers.processors import TemplateProcessing
+
+SEED_DIR = Path(__file__).resolve().parents[2] / "pipeline" / "seeds"
+COLLECTION = "fastsearch_benchmark"
+SPECIAL_TOKENS = ["[PAD]", "[UNK]", "[CLS]", "[SEP]"]
+MAX_SEGMENT_SECONDS = 30
+WORD = re.compile(r"\w+")
+PERCENTILES = (50, 95, 99)
+
+
+def load_segments(num_videos: int) -> list[dict]:
+    """Seed transcript segments merged into ~30s windows, as processed_transcripts does."""
+    lessons = {}
+    with open(SEED_DIR / "fastai_metadata" / "lessons.csv") as file:
+        for lesson in csv.DictReader(file):
+            lessons[lesson["video_id"]] = lesson
+
+    segments = []
+    for path in sorted((SEED_DIR / "transcripts").glob("*.json"))[:num_videos]:
+        lesson = lessons.get(path.stem, {})
+        buffer = []
+        for segment in json.loads(path.read_text())["segments"]:
+            buffer.append(segment)
+            if segment["end"] - buffer[0]["start"] >= MAX_SEGMENT_SECONDS:
+                segments.append(
+                    {
+                        "video_id": path.stem,
+                        "text": "".join(s["text"] for s in buffer),
+                        "start": int(buffer[0]["start"]),
+                        "thumbnail": f"https://i.ytimg.com/vi/{path.stem}/hqdefault.jpg",
+                        "title": lesson.get("name", path.stem),
+                        "lesson": lesson.get("lesson_url"),
+                        "forum": lesson.get("forum_url"),
+                        "course": None,
+                    }
+                )
+                buffer = []
+    return segments
+
+
+def build_tokenizer(texts: list[str], vocab_size: int) -> Tokenizer:
+    """BERT style word level tokenizer over the most common words in texts."""
+    counts = Counter(word for text in texts for word in WORD.findall(text.lower()))
+    words = [word for word, _ in counts.most_common(vocab_size - len(SPECIAL_TOKENS))]
+    vocab = {token: i for i, token in enumerate([*SPECIAL_TOKENS, *words])}
+
+    tokenizer = Tokenizer(WordPiece(vocab, unk_token="[UNK]"))
+    tokenizer.normalizer = BertNormalizer(lowercase=True)
+    tokenizer.pre_tokenizer = BertPreTokenizer()
+    tokenizer.post_processor = TemplateProcessing(
+        single="[CLS] $A [SEP]",
+        pair="[CLS] $A [SEP] $B:1 [SEP]:1",
+        special_tokens=[("[CLS]", vocab["[CLS]"]), ("[SEP]", vocab["[SEP]"])],
+    )
+    return tokenizer
+
+
+def build_encoder(path: Path, vocab_size: int, dim: int, layers: int, head: bool, seed: int) -> None:
+    """Save a mean pooled embedding + dense layers encoder. With head, a single logit per sequence."""
+    rng = np.random.default_rng(seed)
+    initializers = [
+        numpy_helper.from_array(rng.normal(0, 1, (vocab_size, dim)).astype(np.float32), "embeddings"),
+        numpy_helper.from_array(np.array([1], dtype=np.int64), "sequence_axis"),
+        numpy_helper.from_array(np.array([2], dtype=np.int64), "hidden_axis"),
+        numpy_helper.from_array(np.array(1e-9, dtype=np.float32), "eps"),
+    ]
+    nodes = [helper.make_node("Gather", ["embeddings", "input_ids"], ["hidden_0"])]
+    for i in range(layers):
+        weights = rng.normal(0, dim**-0.5, (dim, dim)).astype(np.float32)
+        initializers.append(numpy_helper.from_array(weights, f"dense_{i}"))
+        nodes.append(helper.make_node("MatMul", [f"hidden_{i}", f"dense_{i}"], [f"projected_{i}"]))
+        nodes.append(helper.make_node("Tanh", [f"projected_{i}"], [f"hidden_{i + 1}"]))
+    nodes += [
+        helper.make_node("Cast", ["attention_mask"], ["mask"], to=TensorProto.FLOAT),
+        helper.make_node("Unsqueeze", ["mask", "hidden_axis"], ["expanded_mask"]),
+        helper.make_node("Mul", [f"hidden_{layers}", "expanded_mask"], ["masked"]),
+        helper.make_node("ReduceSum", ["masked", "sequence_axis"], ["summed"], keepdims=0),
+        helper.make_node("ReduceSum", ["expanded_mask", "sequence_axis"], ["counts"], keepdims=0),
+        helper.make_node("Max", ["counts", "eps"], ["clamped_counts"]),
+    ]
+    if head:
+        initializers.append(numpy_helper.from_array(rng.normal(0, 1, (dim, 1)).astype(np.float32), "head"))
+        nodes.append(helper.make_node("Div", ["summed", "clamped_counts"], ["pooled"]))
+        nodes.append(helper.make_node("MatMul", ["pooled", "head"], ["logits"]))
+        output = helper.make_tensor_value_info("logits", TensorProto.FLOAT, ["batch", 1])
+    else:
+        nodes.append(helper.make_node("Div", ["summed", "clamped_counts"], ["sentence_embedding"]))
+        output = helper.make_tensor_value_info("sentence_embedding", TensorProto.FLOAT, ["batch", dim])
+
+    # The tokenizer returns token_type_ids, so the graph declares it even though it is unused.
+    inputs = [
+        helper.make_tensor_value_info(name, TensorProto.INT64, ["batch", "sequence"])
+        for name in ("input_ids", "token_type_ids", "attention_mask")
+    ]
+    graph = helper.make_graph(nodes, path.parent.name, inputs, [output], initializers)
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 17)])
+    model.ir_version = 8
+    onnx.checker.check_model(model)
+    onnx.save(model, path)
+
+
+def build_models(model_dir: Path, texts: list[str], args: argparse.Namespace) -> tuple[Path, Path]:
+    """Write stand-in retriever and ranker model directories laid out like hub repos."""
+    tokenizer = build_tokenizer(texts, args.vocab_size)
+    config = {"model_max_length": args.max_length, "pad_token": "[PAD]"}
+    paths = []
+    for name, head, seed in [("retriever", False, 0), ("ranker", True, 1)]:
+        path = model_dir / name
+        path.mkdir(parents=True)
+        tokenizer.save(str(path / "tokenizer.json"))
+        (path / "tokenizer_config.json").write_text(json.dumps(config))
+        build_encoder(path / "model.onnx", tokenizer.get_vocab_size(), args.dim, args.layers, head, seed)
+        paths.append(path)
+    return paths[0], paths[1]
+
+
+async def seed_index(
+    client, segments: list[dict], retriever, ranker, cache_tokens: bool
+) -> tuple[np.ndarray, list[dict]]:
+    """Create the benchmark collection, version marker and points embedded with the stand-in retriever."""
+    from qdrant_client.http import models
+
+    from backend.qdrant import QDRANT_VERSION_COLLECTION
+
+    texts = [segment["text"] for segment in segments]
+    vectors = np.vstack([np.vstack(retriever.embed(texts[i : i + 64])) for i in range(0, len(texts), 64)])
+    payloads = [dict(segment) for segment in segments]
+    if cache_tokens:
+        for payload, text in zip(payloads, texts):
+            ids = ranker.tokenizer.encode_ids(text)
+            payload["token_ids"] = base64.b64encode(np.asarray(ids, dtype="<i4").tobytes()).decode("ascii")
+            payload["token_model"] = ranker.token_model
+
+    vectors_config = models.VectorParams(size=vectors.shape[-1], distance=models.Distance.COSINE)
+    await client.create_collection(COLLECTION, vectors_config=vectors_config)
+    await client.upsert(
+        COLLECTION,
+        points=[
+            models.PointStruct(id=i, vector=vector.tolist(), payload=payload)
+            for i, (vector, payload) in enumerate(zip(vectors, payloads))
+        ],
+    )
+    await client.create_collection(
+        QDRANT_VERSION_COLLECTION, vectors_config=models.VectorParams(size=1, distance=models.Distance.DOT)
+    )
+    await client.upsert(
+        QDRANT_VERSION_COLLECTION,
+        points=[models.PointStruct(id=0, vector=[1.0], payload={"version": "benchmark"})],
+    )
+    return vectors, payloads
+
+
+def write_export(path: Path, vectors: np.ndarray, payloads: list[dict], version: str) -> None:
+    """Embedded index export laid out like the pipeline's embedded_index asset, ids are row numbers."""
+    from backend.index import MANIFEST_FILE, PAYLOADS_FILE, VECTORS_FILE
+
+    path.mkdir(parents=True, exist_ok=True)
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-9)
+    np.save(path / VECTORS_FILE, vectors.astype(np.float32))
+    (path / PAYLOADS_FILE).write_text(
+        json.dumps([{"id": i, **payload} for i, payload in enumerate(payloads)])
+    )
+    (path / MANIFEST_FILE).write_text(json.dumps({"version": version, "count": len(payloads)}))
+
+
+def build_workload(segments: list[dict], args: argparse.Namespace) -> list[str]:
+    """Queries drawn from segment text, repeated with a Zipf distribution like real query logs."""
+    rng = random.Random(args.seed)
+    queries = []
+    while len(queries) < args.distinct_queries:
+        words = WORD.findall(rng.choice(segments)["text"])
+        length = rng.randint(2, 6)
+        if len(words) >= length:
+            start = rng.randrange(len(words) - length + 1)
+            queries.append(" ".join(words[start : start + length]))
+    weights = [1 / (rank + 1) ** args.zipf for rank in range(len(queries))]
+    return rng.choices(queries, weights=weights, k=args.requests)
+
+
+def parse_server_timing(header: str | None) -> dict[str, float]:
+    """Stage durations in ms from a Server-Timing header."""
+    timings = {}
+    for entry in (header or "").split(","):
+        name, _, duration = entry.strip().partition(";dur=")
+        if duration:
+            timings[name] = float(duration)
+    return timings
+
+
+def summarize(values: list[float]) -> dict:
+    if len(values) == 0:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": float(np.mean(values)),
+        **{f"p{p}": float(np.percentile(values, p)) for p in PERCENTILES},
+    }
+
+
+def histogram_totals(histogram) -> dict[str, tuple[float, int]]:
+    return {key[0]: (series[1], series[2]) for key, series in list(histogram.values.items())}
+
+
+def histogram_means(before: dict, after: dict, scale: float = 1.0) -> dict[str, float]:
+    """Mean observation per label between two histogram snapshots."""
+    means = {}
+    for label, (total, count) in after.items():
+        previous_total, previous_count = before.get(label, (0.0, 0))
+        if count > previous_count:
+            means[label] = (total - previous_total) / (count - previous_count) * scale
+    return means
+
+
+async def run_level(client, queries: list[str], concurrency: int) -> dict:
+    """Issue queries from concurrency workers and summarize latencies."""
+    from backend.batching import BATCH_SIZE
+    from backend.metrics import STAGE_SECONDS
+
+    pending = iter(queries)
+    client_ms, stage_ms, errors = [], {}, 0
+    stages_before, batches_before = histogram_totals(STAGE_SECONDS), histogram_totals(BATCH_SIZE)
+
+    async def worker() -> None:
+        nonlocal errors
+        for query in pending:
+            start = time.perf_counter()
+            response = await client.get("/api/search", params={"query": query})
+            elapsed = (time.perf_counter() - start) * 1000
+            if response.status_code != 200:
+                errors += 1
+                continue
+            client_ms.append(elapsed)
+            for stage, duration in parse_server_timing(response.headers.get("server-timing")).items():
+                stage_ms.setdefault(stage, []).append(duration)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    duration = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(queries),
+        "errors": errors,
+        "duration_s": duration,
+        "throughput_rps": len(client_ms) / duration,
+        "latency_ms": {"client": summarize(client_ms)} | {s: summarize(v) for s, v in stage_ms.items()},
+        "inference_mean_ms": histogram_means(stages_before, histogram_totals(STAGE_SECONDS), 1000),
+        "mean_batch_size": histogram_means(batches_before, histogram_totals(BATCH_SIZE)),
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def benchmark(args: argparse.Namespace) -> dict:
+    segments = load_segments(args.videos)
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        retriever_dir, ranker_dir = build_models(Path(model_dir), [s["text"] for s in segments], args)
+
+        # The backend reads its configuration at import, so it is imported once the environment is set.
+        os.environ["RETRIEVER_MODEL"] = str(retriever_dir)
+        os.environ["RANKING_MODEL"] = str(ranker_dir)
+        os.environ["QDRANT_COLLECTION"] = COLLECTION
+        os.environ["WRITER_ENABLED"] = "false"
+        os.environ.setdefault("NUM_CANDIDATES", "50")
+        os.environ.setdefault("NUM_RESULTS", "10")
+        if args.no_cache:
+            os.environ["RESULT_CACHE_SIZE"] = "0"
+            os.environ["EMBEDDING_CACHE_SIZE"] = "0"
+
+        import httpx
+        from qdrant_client import AsyncQdrantClient
+
+        from backend import app
+        from backend.index import EmbeddedIndex, QdrantIndex
+        from backend.inference import session_config
+        from backend.qdrant import AsyncQdrantPool
+        from backend.routes import search
+
+        search.load_models()
+        if args.qdrant_url is not None:
+            qdrant = AsyncQdrantClient(url=args.qdrant_url)
+            await qdrant.delete_collection(COLLECTION)
+        else:
+            qdrant = AsyncQdrantClient(location=":memory:")
+        vectors, payloads = await seed_index(
+            qdrant, segments, search.retriever, search.ranker, not args.no_token_cache
+        )
+        export_dir = Path(model_dir) / "embedded_index"
+        write_export(export_dir, vectors, payloads, version="benchmark")
+        queries = build_workload(segments, args)
+
+        results = []
+        async with app.router.lifespan_context(app):
+            await app.state.loading
+            await app.state.async_qdrant.close()
+            app.state.async_qdrant = AsyncQdrantPool(factory=lambda: qdrant)
+            indexes = {
+                "qdrant": lambda: QdrantIndex(app.state.async_qdrant, COLLECTION),
+                "embedded": lambda: EmbeddedIndex(export_dir, method=args.embedded_method),
+            }
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+                for index in args.index:
+                    app.state.index = indexes[index]()
+                    await run_level(client, queries[: args.warmup], max(args.concurrency))
+                    for concurrency in args.concurrency:
+                        print(f"{index} concurrency {concurrency}: {args.requests} requests", file=sys.stderr)
+                        results.append({"index": index, **await run_level(client, queries, concurrency)})
+                        search.result_cache.local.entries.clear()
+                        search.embedding_cache.embeddings.entries.clear()
+
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {
+            **vars(args),
+            "segments": len(segments),
+            "session": session_config.model_dump(),
+            "rerank_mode": search.RERANK_MODE,
+            "num_candidates": search.NUM_CANDIDATES,
+            "num_results": search.NUM_RESULTS,
+        },
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=500, help="Requests per concurrency level.")
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--distinct-queries", type=int, default=200)
+    parser.add_argument("--zipf", type=float, default=1.1, help="Query popularity skew, 0 for uniform.")
+    parser.add_argument("--videos", type=int, default=20, help="Seed transcripts to index.")
+    parser.add_argument("--no-cache", action="store_true", help="Disable result and embedding caches.")
+    parser.add_argument("--no-token-cache", action="store_true", help="Index without ranker token ids.")
+    parser.add_argument(
+        "--index",
+        nargs="+",
+        choices=["qdrant", "embedded"],
+        default=["qdrant", "embedded"],
+        help="Candidate retrieval backends to compare, run one after the other.",
+    )
+    parser.add_argument("--embedded-method", choices=["exact", "hnsw"], default="exact")
+    parser.add_argument(
+        "--qdrant-url",
+        help="Seed and search a running Qdrant (e.g. http://localhost:6333) instead of local mode,"
+        " which is needed for a fair comparison of network round trips against the embedded index.",
+    )
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--layers", type=int, default=2)
+    parser.add_argument("--vocab-size", type=int, default=8192)
+    parser.add_argument("--max-length", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Write JSON results here instead of stdout.")
+    args = parser.parse_args()
+
+    report = asyncio.run(benchmark(args))
+    output = json.dumps(report, indent=2, default=str)
+    if args.output is None:
+        print(output)
+    else:
+        args.output.write_text(output)
@@ -0,0 +1,78 @@
+"""Compare requests/sec of per-request Qdrant clients against the pooled clients used by the backend.
+
+Run against a local Qdrant stand-in, e.g. `docker run -p 6333:6333 -p 6334:6334 qdrant/qdrant`:
+
+    QDRANT_HOST=localhost uv run scripts/benchmark_qdrant_pool.py --requests 2000 --concurrency 16
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from qdrant_client.http import models
+
+from backend.qdrant import QdrantPool, create_client
+
+COLLECTION = "fastsearch_benchmark"
+
+
+def seed_collection(num_points: int, dim: int) -> None:
+    """Create throwaway collection of random vectors to search against."""
+    client = create_client()
+    client.recreate_collection(
+        collection_name=COLLECTION,
+        vectors_config=models.VectorParams(size=dim, distance=models.Distance.COSINE),
+    )
+    client.upload_collection(
+        collection_name=COLLECTION,
+        vectors=np.random.rand(num_points, dim).astype(np.float32),
+        ids=range(num_points),
+    )
+    client.close()
+
+
+def run(search_fn, num_requests: int, concurrency: int, dim: int) -> float:
+    """Execute search_fn concurrently and return requests/sec."""
+    queries = np.random.rand(num_requests, dim).astype(np.float32).tolist()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(search_fn, queries))
+    return num_requests / (time.perf_counter() - start)
+
+
+def per_request_search(query: list[float]) -> None:
+    client = create_client()
+    client.search(collection_name=COLLECTION, query_vector=query, limit=30)
+    client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--points", type=int, default=27_000)
+    parser.add_argument("--dim", type=int, default=384)
+    args = parser.parse_args()
+
+    seed_collection(args.points, args.dim)
+
+    before = run(per_request_search, args.requests, args.concurrency, args.dim)
+    print(f"per-request client: {before:8.1f} req/s")
+
+    pool = QdrantPool(size=args.pool_size)
+
+    def pooled_search(query: list[float]) -> None:
+        with pool.client() as client:
+            client.search(collection_name=COLLECTION, query_vector=query, limit=30)
+
+    after = run(pooled_search, args.requests, args.concurrency, args.dim)
+    print(f"pooled clients:     {after:8.1f} req/s ({after / before:.2f}x)")
+
+    pool.close()
+    create_client().delete_collection(COLLECTION)
+
+
+if __name__ == "__main__":
+    main()
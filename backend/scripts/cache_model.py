@@ -1,13 +1,45 @@
 import os
+from pathlib import Path
 
-from huggingface_hub import hf_hub_download, login
-from transformers import AutoTokenizer
+import onnxruntime as ort
+from huggingface_hub import hf_hub_download, login, snapshot_download
+from huggingface_hub.utils import EntryNotFoundError
+
+# Optional reduced precision exports, selected at startup by backend.inference.load_session.
+MODEL_VARIANTS = ["model_quantized.onnx", "model_fp16.onnx"]
+# Serialized fast tokenizer loaded by backend.inference.FastTokenizer, without transformers.
+TOKENIZER_FILES = ["tokenizer.json", "tokenizer_config.json", "special_tokens_map.json"]
+# Slow tokenizer files, for models without a tokenizer.json which the backend converts with transformers.
+SLOW_TOKENIZER_FILES = ["config.json", "vocab*", "merges.txt", "*.model"]
+
+
+def optimize_model(model_path: str) -> None:
+    """Save graph optimized model next to model_path so backend sessions skip optimization on start.
+
+    Uses extended (not layout) optimizations so the saved graph stays portable across x86 hosts.
+    """
+    session_opts = ort.SessionOptions()
+    session_opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+    session_opts.optimized_model_filepath = str(Path(model_path).with_suffix(".opt.onnx"))
+    ort.InferenceSession(model_path, session_opts)
 
 
 def download_hub(repo_id: str):
     """Download model and tokenizer for model hub."""
-    tokenizer = AutoTokenizer.from_pretrained(repo_id)
+    for filename in TOKENIZER_FILES:
+        try:
+            hf_hub_download(repo_id, filename)
+        except EntryNotFoundError:
+            print(f"{repo_id}: no {filename} published, skipping.")
+            if filename == "tokenizer.json":
+                snapshot_download(repo_id, allow_patterns=SLOW_TOKENIZER_FILES)
     model = hf_hub_download(repo_id, "model.onnx")
+    optimize_model(model)
+    for filename in MODEL_VARIANTS:
+        try:
+            optimize_model(hf_hub_download(repo_id, filename))
+        except EntryNotFoundError:
+            print(f"{repo_id}: no {filename} published, skipping.")
 
 
 if __name__ == "__main__":
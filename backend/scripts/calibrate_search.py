@@ -0,0 +1,156 @@
+"""Calibrate search tiers (hnsw_ef, candidate count) against exact search on the live collection.
+
+For a sample of query vectors, measures recall@k of HNSW search against `exact=True` ground truth and
+its latency for every combination in the grid, then writes the recall/latency Pareto frontier as a
+profile the backend loads from SEARCH_PROFILE:
+
+    QDRANT_HOST=... QDRANT_API_KEY=... QDRANT_COLLECTION=... \\
+        uv run scripts/calibrate_search.py --queries queries.txt --output search_profile.json
+
+Queries are embedded with RETRIEVER_MODEL when a file of queries is given, otherwise stored vectors
+are sampled from the collection.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+from qdrant_client.http import models
+
+from backend.qdrant import QDRANT_COLLECTION, create_client
+from backend.tuning import SearchProfile, SearchTier
+
+
+def resolve_collection(client) -> str:
+    """Versioned collection behind the QDRANT_COLLECTION alias, which the profile was calibrated on."""
+    for alias in client.get_aliases().aliases:
+        if alias.alias_name == QDRANT_COLLECTION:
+            return alias.collection_name
+    return QDRANT_COLLECTION
+
+
+def sample_vectors(client, collection: str, num_queries: int, seed: int) -> list[list[float]]:
+    """Stored vectors from a random sample of points."""
+    points, offset = [], None
+    while len(points) < num_queries * 20:
+        batch, offset = client.scroll(
+            collection, limit=1024, offset=offset, with_payload=False, with_vectors=True
+        )
+        points.extend(batch)
+        if offset is None:
+            break
+    rng = random.Random(seed)
+    return [point.vector for point in rng.sample(points, min(num_queries, len(points)))]
+
+
+def embed_queries(path: str, num_queries: int, seed: int) -> list[list[float]]:
+    # Imported here so calibrating on stored vectors doesn't need the retriever model.
+    from backend.inference import ONNXRetriever
+
+    with open(path) as file:
+        queries = [line.strip() for line in file if line.strip()]
+    queries = random.Random(seed).sample(queries, min(num_queries, len(queries)))
+    retriever = ONNXRetriever(model_id=os.getenv("RETRIEVER_MODEL"))
+    retriever.load()
+    return [embedding.tolist() for embedding in retriever.embed(queries)]
+
+
+def search(
+    client, collection: str, vector: list[float], limit: int, params: models.SearchParams
+) -> tuple[set, float]:
+    start = time.perf_counter()
+    points = client.search(collection, query_vector=vector, limit=limit, search_params=params)
+    return {point.id for point in points}, (time.perf_counter() - start) * 1000
+
+
+def calibrate(
+    client, collection: str, vectors: list[list[float]], args: argparse.Namespace
+) -> list[SearchTier]:
+    exact = [search(client, collection, v, args.k, models.SearchParams(exact=True))[0] for v in vectors]
+
+    tiers = []
+    for hnsw_ef in args.ef:
+        for num_candidates in args.candidates:
+            if num_candidates < args.k:
+                continue
+            params = models.SearchParams(hnsw_ef=max(hnsw_ef, num_candidates), exact=False)
+            recalls, latencies = [], []
+            for _ in range(args.repeats):
+                for vector, truth in zip(vectors, exact):
+                    found, latency = search(client, collection, vector, num_candidates, params)
+                    recalls.append(len(found & truth) / len(truth))
+                    latencies.append(latency)
+            tier = SearchTier(
+                hnsw_ef=params.hnsw_ef,
+                num_candidates=num_candidates,
+                recall=float(np.mean(recalls)),
+                qdrant_ms=float(np.percentile(latencies, 50)),
+            )
+            print(f"ef={tier.hnsw_ef} candidates={num_candidates}: {tier.recall:.4f}, {tier.qdrant_ms:.2f}ms")
+            tiers.append(tier)
+    return tiers
+
+
+def pareto(tiers: list[SearchTier], rerank_ms_per_candidate: float) -> list[SearchTier]:
+    """Tiers no other tier beats on both recall and estimated cost, ordered by increasing cost."""
+
+    def cost(tier: SearchTier) -> float:
+        return tier.qdrant_ms + tier.num_candidates * rerank_ms_per_candidate
+
+    frontier = []
+    for tier in sorted(tiers, key=lambda tier: (cost(tier), -tier.recall)):
+        if len(frontier) == 0 or tier.recall > frontier[-1].recall:
+            frontier.append(tier)
+    return frontier
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("--queries", help="File with one query per line, embedded with RETRIEVER_MODEL.")
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10, help="Recall is measured over the exact top k.")
+    parser.add_argument("--ef", type=int, nargs="+", default=[16, 32, 64, 128, 256, 512])
+    parser.add_argument("--candidates", type=int, nargs="+", default=[10, 20, 30, 50, 100])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument(
+        "--rerank-ms-per-candidate",
+        type=float,
+        default=0.5,
+        help="Initial rerank cost estimate, refined online by the backend.",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="search_profile.json")
+    args = parser.parse_args()
+
+    client = create_client()
+    # Calibrated on the collection behind the alias, which the backend compares the profile against.
+    collection = resolve_collection(client)
+    if args.queries is not None:
+        vectors = embed_queries(args.queries, args.num_queries, args.seed)
+    else:
+        vectors = sample_vectors(client, collection, args.num_queries, args.seed)
+    if len(vectors) == 0:
+        sys.exit(f"No query vectors: {collection} is empty and no --queries file was given.")
+
+    tiers = pareto(calibrate(client, collection, vectors, args), args.rerank_ms_per_candidate)
+    if len(tiers) == 0:
+        sys.exit(f"No tiers to calibrate: every --candidates value is below --k={args.k}.")
+    passing = [i for i, tier in enumerate(tiers) if tier.recall >= args.target_recall]
+    profile = SearchProfile(
+        collection=collection,
+        k=args.k,
+        tiers=tiers,
+        recommended=passing[0] if len(passing) > 0 else len(tiers) - 1,
+        rerank_ms_per_candidate=args.rerank_ms_per_candidate,
+    )
+    with open(args.output, "w") as file:
+        file.write(profile.model_dump_json(indent=2))
+    recommended = tiers[profile.recommended]
+    print(
+        f"Recommended ef={recommended.hnsw_ef} candidates={recommended.num_candidates}: "
+        f"recall {recommended.recall:.4f}, {recommended.qdrant_ms:.2f}ms. Wrote {args.output}."
+    )
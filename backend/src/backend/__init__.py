@@ -1,20 +1,89 @@
-from fastapi import APIRouter, FastAPI
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+
+from backend import metrics
+from backend.database import async_engine
+from backend.index import QdrantIndex, create_index
+from backend.inference import executor, run_inference
+from backend.qdrant import AsyncQdrantPool, resolve_alias
 from backend.routes import feedback, search
 
+logger = logging.getLogger(__name__)
+
+
+async def load_models(app: FastAPI) -> None:
+    """Load and warm up models off the event loop so health checks are answered meanwhile."""
+    try:
+        await run_inference(search.load_models)
+    except Exception:
+        logger.exception("Failed to load models.")
+        raise
+    await check_search_profile(app)
+    app.state.ready = True
+
+
+async def check_search_profile(app: FastAPI) -> None:
+    """Warn about a search profile calibrated on another collection than the one the alias points at."""
+    index = app.state.index
+    if not isinstance(index, QdrantIndex) or search.tuner.profile is None:
+        return
+    try:
+        search.tuner.check_collection(await resolve_alias(index.pool, index.collection))
+    except Exception:
+        logger.exception("Could not check the search profile's collection.")
+
+
+def require_ready(request: Request) -> None:
+    if not request.app.state.ready:
+        raise HTTPException(status_code=503, detail="Loading models.")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open pooled Qdrant connections, start buffered writers and load models, then close them on shutdown.
+
+    Models load in the background and the root health check reports ready once they are warm.
+    """
+    app.state.ready = False
+    app.state.async_qdrant = AsyncQdrantPool()
+    app.state.index = create_index(app.state.async_qdrant)
+    app.state.loading = asyncio.create_task(load_models(app))
+    search.query_log.start()
+    feedback.feedback_log.start()
+    yield
+    app.state.loading.cancel()
+    await search.query_log.stop()
+    await feedback.feedback_log.stop()
+    await app.state.async_qdrant.close()
+    await search.result_cache.close()
+    await async_engine.dispose()
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
 app = FastAPI(
     title="FastSearch",
     description="Semantic search for fast.ai lectures.",
+    lifespan=lifespan,
 )
+app.add_middleware(metrics.ServerTimingMiddleware)
 
 
 # Declare API routes
-api = APIRouter(prefix="/api", tags=["api"])
+api = APIRouter(prefix="/api", tags=["api"], dependencies=[Depends(require_ready)])
 api.include_router(search.router)
 api.include_router(feedback.router)
 app.include_router(api)
 
 
-@app.get("/")
+@app.get("/", dependencies=[Depends(require_ready)])
 def root() -> dict:
     return {"msg": "success"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def prometheus_metrics() -> str:
+    return metrics.render()
@@ -0,0 +1,79 @@
+import asyncio
+import time
+from typing import Callable, Generic, TypeVar
+
+from backend.inference import run_inference
+from backend.metrics import SIZE_BUCKETS, Histogram, register
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+BATCH_SIZE = register(
+    Histogram("fastsearch_batch_size", "Requests coalesced per batch.", ("batcher",), buckets=SIZE_BUCKETS)
+)
+BATCH_WAIT = register(
+    Histogram("fastsearch_batch_wait_seconds", "Time requests spend queued for a batch.", ("batcher",))
+)
+BATCH_LATENCY = register(
+    Histogram("fastsearch_batch_latency_seconds", "Time from submission to batch result.", ("batcher",))
+)
+
+
+class MicroBatcher(Generic[T, R]):
+    """Coalesce concurrent submissions into one call of a batch function.
+
+    A batch is dispatched to the inference executor once `max_batch_size` items are queued or
+    `max_wait_ms` has elapsed since the first item arrived, whichever comes first.
+    """
+
+    def __init__(
+        self, name: str, fn: Callable[[list[T]], list[R]], max_batch_size: int, max_wait_ms: float
+    ) -> None:
+        self.name = name
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.pending: list[tuple[T, asyncio.Future, float]] = []
+        self.timer: asyncio.TimerHandle | None = None
+        self.tasks: set[asyncio.Task] = set()
+
+    async def submit(self, item: T) -> R:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((item, future, time.perf_counter()))
+        if len(self.pending) >= self.max_batch_size:
+            self.flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.max_wait, self.flush)
+        return await future
+
+    def flush(self) -> None:
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if len(batch) == 0:
+            return
+        task = asyncio.create_task(self.run(batch))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def run(self, batch: list[tuple[T, asyncio.Future, float]]) -> None:
+        started = time.perf_counter()
+        BATCH_SIZE.observe(len(batch), batcher=self.name)
+        for _, _, queued in batch:
+            BATCH_WAIT.observe(started - queued, batcher=self.name)
+
+        try:
+            results = await run_inference(self.fn, [item for item, _, _ in batch])
+        except Exception as err:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(err)
+            return
+
+        finished = time.perf_counter()
+        for (_, future, queued), result in zip(batch, results):
+            BATCH_LATENCY.observe(finished - queued, batcher=self.name)
+            if not future.done():
+                future.set_result(result)
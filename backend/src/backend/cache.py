@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Protocol
+
+import numpy as np
+
+from backend.metrics import Counter, register
+from backend.qdrant import QDRANT_VERSION_COLLECTION, AsyncQdrantPool
+
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "4096"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "3600"))
+RESULT_CACHE_URL = os.getenv("RESULT_CACHE_URL")
+VERSION_REFRESH_SECONDS = float(os.getenv("VERSION_REFRESH_SECONDS", "30"))
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "8192"))
+
+EMBEDDING_CACHE = register(
+    Counter("fastsearch_embedding_cache_total", "Query embedding cache lookups.", ("result",))
+)
+
+PUNCTUATION = re.compile(r"[^\w\s]")
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Fold case, unicode forms, punctuation and whitespace so trivially different queries share a key."""
+    query = unicodedata.normalize("NFKC", query).casefold()
+    query = PUNCTUATION.sub(" ", query)
+    return WHITESPACE.sub(" ", query).strip()
+
+
+class LRUCache:
+    """Bounded least recently used mapping with optional time-to-live."""
+
+    def __init__(self, capacity: int, ttl: float | None = None) -> None:
+        self.capacity = capacity
+        self.ttl = ttl
+        self.entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: str) -> Any | None:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        ttl = ttl if ttl is not None else self.ttl
+        expires = time.monotonic() + ttl if ttl is not None else float("inf")
+        self.entries[key] = (expires, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+
+class EmbeddingCache:
+    """Bounded LRU memo of query embeddings keyed on the normalized query text."""
+
+    def __init__(self, capacity: int = EMBEDDING_CACHE_SIZE) -> None:
+        self.embeddings = LRUCache(capacity)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, query: str) -> np.ndarray | None:
+        embedding = self.embeddings.get(normalize_query(query)) if self.embeddings.capacity > 0 else None
+        if embedding is None:
+            self.misses += 1
+            EMBEDDING_CACHE.inc(result="miss")
+        else:
+            self.hits += 1
+            EMBEDDING_CACHE.inc(result="hit")
+        return embedding
+
+    def set(self, query: str, embedding: np.ndarray) -> None:
+        if self.embeddings.capacity > 0:
+            self.embeddings.set(normalize_query(query), np.asarray(embedding, dtype=np.float32))
+
+
+class SharedStore(Protocol):
+    async def get(self, key: str) -> str | None: ...
+
+    async def set(self, key: str, value: str, ttl: float) -> None: ...
+
+    async def close(self) -> None: ...
+
+
+class MemoryStore:
+    """In-process stand-in for a shared cache tier, for local development and testing."""
+
+    def __init__(self, capacity: int = RESULT_CACHE_SIZE) -> None:
+        self.cache = LRUCache(capacity)
+
+    async def get(self, key: str) -> str | None:
+        return self.cache.get(key)
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        self.cache.set(key, value, ttl)
+
+    async def close(self) -> None:
+        self.cache.entries.clear()
+
+
+class RedisStore:
+    def __init__(self, url: str) -> None:
+        try:
+            from redis import asyncio as redis
+        except ImportError as err:
+            raise RuntimeError("Install backend[redis] to use a redis result cache.") from err
+        self.client = redis.from_url(url)
+
+    async def get(self, key: str) -> str | None:
+        value = await self.client.get(key)
+        return None if value is None else value.decode("utf8")
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        await self.client.set(key, value, ex=int(ttl))
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+def create_store(url: str | None) -> SharedStore | None:
+    """Shared cache tier for url. `memory://` selects the in-process stand-in."""
+    if url is None or url == "":
+        return None
+    if url.startswith("memory://"):
+        return MemoryStore()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisStore(url)
+    raise ValueError(f"Unsupported result cache url: {url}")
+
+
+class ResultCache:
+    """Two tier search result cache: a bounded in-process LRU in front of an optional shared store."""
+
+    def __init__(
+        self,
+        namespace: str,
+        capacity: int = RESULT_CACHE_SIZE,
+        ttl: float = RESULT_CACHE_TTL,
+        shared: SharedStore | None = None,
+    ) -> None:
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local = LRUCache(capacity, ttl)
+        self.shared = shared
+
+    def key(self, query: str, version: str) -> str:
+        digest = hashlib.sha256(f"{self.namespace}\x00{version}\x00{normalize_query(query)}".encode("utf8"))
+        return f"fastsearch:results:{digest.hexdigest()}"
+
+    async def get(self, key: str) -> list[dict] | None:
+        results = self.local.get(key)
+        if results is None and self.shared is not None:
+            value = await self.shared.get(key)
+            if value is not None:
+                results = json.loads(value)
+                self.local.set(key, results)
+        return results
+
+    async def set(self, key: str, results: list[dict]) -> None:
+        self.local.set(key, results)
+        if self.shared is not None:
+            await self.shared.set(key, json.dumps(results), self.ttl)
+
+    async def close(self) -> None:
+        if self.shared is not None:
+            await self.shared.close()
+
+
+class CollectionVersion:
+    """Version marker the pipeline bumps whenever vector_index rematerializes, refreshed periodically."""
+
+    def __init__(self, refresh_seconds: float = VERSION_REFRESH_SECONDS) -> None:
+        self.refresh_seconds = refresh_seconds
+        self.version = "unknown"
+        self.refreshed = float("-inf")
+
+    async def get(self, pool: AsyncQdrantPool) -> str:
+        if time.monotonic() - self.refreshed > self.refresh_seconds:
+            self.refreshed = time.monotonic()
+            try:
+                async with pool.client() as client:
+                    points = await client.retrieve(QDRANT_VERSION_COLLECTION, ids=[0], with_payload=True)
+                self.version = points[0].payload["version"] if len(points) > 0 else "unknown"
+            except Exception:
+                # Keep serving with the last known version, the marker is retried next refresh.
+                pass
+        return self.version
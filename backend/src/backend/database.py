@@ -2,20 +2,42 @@ import os
 import platform
 from pathlib import Path
 
-from sqlalchemy import URL, create_engine
+from sqlalchemy import URL
+from sqlalchemy.ext.asyncio import create_async_engine
 
 PG_HOST = os.getenv("PGHOST")
 PG_DATABASE = os.getenv("PGDATABASE")
 PG_USER = os.getenv("PGUSER")
 PG_PASSWORD = os.getenv("PGPASSWORD")
 
-engine = create_engine(
-    url=URL.create(
-        drivername="postgresql+psycopg",
-        host=PG_HOST,
-        database=PG_DATABASE,
-        username=PG_USER,
-        password=PG_PASSWORD,
-        query={"sslmode": "require"},
-    )
+# Connection pool. Neon suspends idle computes and drops their connections, so connections are
+# recycled before the suspend timeout and pinged before use to avoid stale connection errors.
+PG_POOL_SIZE = int(os.getenv("PG_POOL_SIZE", "5"))
+PG_MAX_OVERFLOW = int(os.getenv("PG_MAX_OVERFLOW", "5"))
+PG_POOL_TIMEOUT = float(os.getenv("PG_POOL_TIMEOUT", "10"))
+PG_POOL_RECYCLE = int(os.getenv("PG_POOL_RECYCLE", "240"))
+PG_POOL_PRE_PING = os.getenv("PG_POOL_PRE_PING", "true").lower() == "true"
+PG_STATEMENT_TIMEOUT_MS = os.getenv("PG_STATEMENT_TIMEOUT_MS")
+
+url = URL.create(
+    drivername="postgresql+psycopg",
+    host=PG_HOST,
+    database=PG_DATABASE,
+    username=PG_USER,
+    password=PG_PASSWORD,
+    query={"sslmode": "require"},
 )
+
+engine_options = {
+    "pool_size": PG_POOL_SIZE,
+    "max_overflow": PG_MAX_OVERFLOW,
+    "pool_timeout": PG_POOL_TIMEOUT,
+    "pool_recycle": PG_POOL_RECYCLE,
+    "pool_pre_ping": PG_POOL_PRE_PING,
+    "connect_args": (
+        {"options": f"-c statement_timeout={int(PG_STATEMENT_TIMEOUT_MS)}"} if PG_STATEMENT_TIMEOUT_MS else {}
+    ),
+}
+
+# psycopg's async driver, so DB I/O from routes and buffered writers doesn't occupy threadpool slots.
+async_engine = create_async_engine(url=url, **engine_options)
@@ -0,0 +1,177 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Protocol
+
+import numpy as np
+from qdrant_client.http import models
+
+from backend.cache import CollectionVersion
+from backend.inference import run_inference
+from backend.lexical import LEXICAL_VECTOR, LexicalIndex, query_vector
+from backend.qdrant import QDRANT_COLLECTION, QDRANT_LEXICAL_COLLECTION, AsyncQdrantPool
+
+# "qdrant" searches the Qdrant collection, "embedded" an in-process index exported by the pipeline.
+SEARCH_INDEX = os.getenv("SEARCH_INDEX", "qdrant")
+EMBEDDED_INDEX_DIR = os.getenv("EMBEDDED_INDEX_DIR")
+# "exact" scores every vector with one matrix-vector product, "hnsw" builds an hnswlib graph on load.
+EMBEDDED_INDEX_METHOD = os.getenv("EMBEDDED_INDEX_METHOD", "exact")
+EMBEDDED_HNSW_M = int(os.getenv("EMBEDDED_HNSW_M", "16"))
+EMBEDDED_HNSW_EF_CONSTRUCTION = int(os.getenv("EMBEDDED_HNSW_EF_CONSTRUCTION", "200"))
+
+# Export layout shared with the pipeline's embedded_index asset.
+MANIFEST_FILE = "manifest.json"
+VECTORS_FILE = "vectors.npy"
+PAYLOADS_FILE = "payloads.json"
+
+
+class VectorIndex(Protocol):
+    """Candidate retrieval backend used by the search route."""
+
+    async def version(self) -> str: ...
+
+    async def search(
+        self, vector: list[float], limit: int, hnsw_ef: int, fields: list[str]
+    ) -> list[models.ScoredPoint]: ...
+
+    async def search_lexical(self, query: str, limit: int, fields: list[str]) -> list[models.ScoredPoint]: ...
+
+    async def retrieve(self, ids: list[int | str], fields: list[str]) -> dict[int | str, dict]: ...
+
+
+class QdrantIndex:
+    """Search the Qdrant collection through the pooled async clients."""
+
+    def __init__(
+        self,
+        pool: AsyncQdrantPool,
+        collection: str = QDRANT_COLLECTION,
+        lexical_collection: str = QDRANT_LEXICAL_COLLECTION,
+    ) -> None:
+        self.pool = pool
+        self.collection = collection
+        self.lexical_collection = lexical_collection
+        self.collection_version = CollectionVersion()
+
+    async def version(self) -> str:
+        return await self.collection_version.get(self.pool)
+
+    async def search(
+        self, vector: list[float], limit: int, hnsw_ef: int, fields: list[str]
+    ) -> list[models.ScoredPoint]:
+        async with self.pool.client() as client:
+            return await client.search(
+                collection_name=self.collection,
+                search_params=models.SearchParams(hnsw_ef=hnsw_ef, exact=False),
+                query_vector=vector,
+                limit=limit,
+                with_payload=models.PayloadSelectorInclude(include=fields),
+            )
+
+    async def search_lexical(self, query: str, limit: int, fields: list[str]) -> list[models.ScoredPoint]:
+        async with self.pool.client() as client:
+            response = await client.query_points(
+                collection_name=self.lexical_collection,
+                query=query_vector(query),
+                using=LEXICAL_VECTOR,
+                limit=limit,
+                with_payload=models.PayloadSelectorInclude(include=fields),
+            )
+        return response.points
+
+    async def retrieve(self, ids: list[int | str], fields: list[str]) -> dict[int | str, dict]:
+        async with self.pool.client() as client:
+            points = await client.retrieve(
+                collection_name=self.collection, ids=ids, with_payload=fields, with_vectors=False
+            )
+        return {point.id: point.payload for point in points}
+
+
+class EmbeddedIndex:
+    """In-process index over a vector matrix and payload table exported by the pipeline.
+
+    Float32 exports are memory-mapped. Float16 exports halve the artifact but are upcast to float32 on
+    load, since numpy has no fast float16 matrix-vector product. Scores are dot products of unit
+    vectors, matching the Qdrant collection's cosine distance.
+    """
+
+    def __init__(self, path: str | Path, method: str = EMBEDDED_INDEX_METHOD) -> None:
+        path = Path(path)
+        self.manifest = json.loads((path / MANIFEST_FILE).read_text())
+        vectors = np.load(path / VECTORS_FILE, mmap_mode="r")
+        self.vectors = vectors if vectors.dtype == np.float32 else np.asarray(vectors, dtype=np.float32)
+        table = json.loads((path / PAYLOADS_FILE).read_text())
+        self.ids = [row.pop("id") for row in table]
+        self.payloads = table
+        self.rows = {point_id: row for row, point_id in enumerate(self.ids)}
+        self.graph = self.build_graph() if method == "hnsw" and len(self.ids) > 0 else None
+        self.lock = threading.Lock()
+        self.lexical = LexicalIndex([payload["text"] for payload in self.payloads])
+
+    def build_graph(self):
+        try:
+            import hnswlib
+        except ImportError as err:
+            raise RuntimeError("Install backend[hnsw] to use the embedded hnsw index.") from err
+        graph = hnswlib.Index(space="ip", dim=self.vectors.shape[1])
+        graph.init_index(len(self.ids), ef_construction=EMBEDDED_HNSW_EF_CONSTRUCTION, M=EMBEDDED_HNSW_M)
+        graph.add_items(self.vectors, np.arange(len(self.ids)))
+        return graph
+
+    async def version(self) -> str:
+        return self.manifest["version"]
+
+    def top_k(self, vector: list[float], limit: int, hnsw_ef: int) -> tuple[np.ndarray, np.ndarray]:
+        """Rows and scores of the limit nearest vectors, best first."""
+        query = np.asarray(vector, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-9)
+        limit = min(limit, len(self.ids))
+        if limit == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if self.graph is not None:
+            # hnswlib's ef is index wide state, so setting it and querying must not interleave.
+            with self.lock:
+                self.graph.set_ef(max(hnsw_ef, limit))
+                rows, distances = self.graph.knn_query(query, k=limit, num_threads=1)
+            return rows[0], 1 - distances[0]
+        scores = self.vectors @ query
+        rows = np.argpartition(-scores, limit - 1)[:limit]
+        rows = rows[np.argsort(-scores[rows], kind="stable")]
+        return rows, scores[rows]
+
+    async def search(
+        self, vector: list[float], limit: int, hnsw_ef: int, fields: list[str]
+    ) -> list[models.ScoredPoint]:
+        rows, scores = await run_inference(self.top_k, vector, limit, hnsw_ef)
+        return self.points(rows, scores, fields)
+
+    async def search_lexical(self, query: str, limit: int, fields: list[str]) -> list[models.ScoredPoint]:
+        rows, scores = await run_inference(self.lexical.top_k, query, limit)
+        return self.points(rows, scores, fields)
+
+    def points(self, rows: np.ndarray, scores: np.ndarray, fields: list[str]) -> list[models.ScoredPoint]:
+        return [
+            models.ScoredPoint(
+                id=self.ids[row],
+                version=0,
+                score=float(score),
+                payload={field: self.payloads[row].get(field) for field in fields},
+            )
+            for row, score in zip(rows.tolist(), scores.tolist())
+        ]
+
+    async def retrieve(self, ids: list[int | str], fields: list[str]) -> dict[int | str, dict]:
+        return {
+            point_id: {field: self.payloads[self.rows[point_id]].get(field) for field in fields}
+            for point_id in ids
+            if point_id in self.rows
+        }
+
+
+def create_index(pool: AsyncQdrantPool) -> VectorIndex:
+    if SEARCH_INDEX == "embedded":
+        return EmbeddedIndex(EMBEDDED_INDEX_DIR)
+    if SEARCH_INDEX == "qdrant":
+        return QdrantIndex(pool)
+    raise ValueError(f"Unsupported search index: {SEARCH_INDEX}")
@@ -0,0 +1,458 @@
+import asyncio
+import base64
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Callable, Literal, TypeVar
+
+import numpy as np
+import onnxruntime as ort
+from huggingface_hub import hf_hub_download, snapshot_download
+from huggingface_hub.utils import EntryNotFoundError
+from pydantic import BaseModel
+from tokenizers import Tokenizer
+
+from backend.metrics import timer
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Web server worker processes (gunicorn.conf.py). CPUs are split evenly between them, so presets are per
+# worker: with two workers on 4 vCPU use the 2vcpu preset.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+NUM_CPUS = max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY)
+
+SESSION_ENV_VARS = {
+    "inference_workers": "INFERENCE_WORKERS",
+    "intra_op_threads": "ORT_INTRA_OP_THREADS",
+    "inter_op_threads": "ORT_INTER_OP_THREADS",
+    "execution_mode": "ORT_EXECUTION_MODE",
+    "cpu_mem_arena": "ORT_CPU_MEM_ARENA",
+    "mem_pattern": "ORT_MEM_PATTERN",
+    "allow_spinning": "ORT_ALLOW_SPINNING",
+    "optimized_model": "ORT_OPTIMIZED_MODEL",
+}
+
+SESSION_PRESETS = {
+    # One core shared with uvicorn: a single single-threaded session, requests queue for it.
+    "1vcpu": {"inference_workers": 1, "intra_op_threads": 1},
+    # Two sessions side by side so a long rerank doesn't block the next query's encoder pass.
+    "2vcpu": {"inference_workers": 2, "intra_op_threads": 1},
+    # App Runner default (infra/backend/core.py). Two sessions with two threads each trades a little
+    # peak throughput for lower per-query latency than four single threaded sessions.
+    "4vcpu": {"inference_workers": 2, "intra_op_threads": 2},
+}
+
+
+class SessionConfig(BaseModel):
+    """ONNX Runtime session and inference executor settings.
+
+    Concurrent sessions are capped at `inference_workers` and each gets `intra_op_threads`, so
+    inference never oversubscribes the CPU no matter how many requests the event loop has in flight.
+    Spin waiting is off by default since idle spinning threads steal cores from uvicorn.
+    """
+
+    inference_workers: int
+    intra_op_threads: int
+    inter_op_threads: int = 1
+    execution_mode: Literal["sequential", "parallel"] = "sequential"
+    cpu_mem_arena: bool = True
+    mem_pattern: bool = True
+    allow_spinning: bool = False
+    # Load the graph optimized at image build time (scripts/cache_model.py) and skip optimization.
+    optimized_model: bool = True
+
+    @classmethod
+    def from_env(cls) -> "SessionConfig":
+        """Config from ORT_PRESET, with any field overridden by its environment variable."""
+        preset = os.getenv("ORT_PRESET")
+        config = dict(SESSION_PRESETS[preset]) if preset else {}
+        for field, env_var in SESSION_ENV_VARS.items():
+            if os.getenv(env_var):
+                config[field] = os.getenv(env_var)
+        config.setdefault("inference_workers", NUM_CPUS)
+        config.setdefault("intra_op_threads", max(1, NUM_CPUS // int(config["inference_workers"])))
+        return cls(**config)
+
+
+session_config = SessionConfig.from_env()
+
+# Reduced precision exports published next to the full precision model. "auto" picks the first
+# variant which passes the startup self-check against the FP32 reference, then falls back to FP32.
+MODEL_VARIANT = os.getenv("MODEL_VARIANT", "auto")
+MODEL_VARIANT_TOLERANCE = float(os.getenv("MODEL_VARIANT_TOLERANCE", "0.05"))
+MODEL_FILES = {"fp32": "model.onnx", "int8": "model_quantized.onnx", "fp16": "model_fp16.onnx"}
+
+SELF_CHECK_QUERIES = [
+    "what is a learning rate",
+    "how do I set up my environment for lesson 1",
+    "why does fine_tune unfreeze the pretrained layers",
+    "DataBlock splitter",
+]
+SELF_CHECK_PASSAGE = (
+    " So the learning rate is the thing that we multiply the gradient by to decide how far to step,"
+    " and if it's too high you'll see your loss diverge."
+)
+# Cap on the tokenizer's model_max_length, which is unset (effectively infinite) in some tokenizer configs.
+TOKENIZER_MAX_LENGTH = int(os.getenv("TOKENIZER_MAX_LENGTH", "512"))
+# Sequence lengths (tokens) run once at startup so first queries don't pay for first-run allocations.
+WARMUP_LENGTHS = [int(length) for length in os.getenv("WARMUP_LENGTHS", "16,64,128,256").split(",")]
+
+executor = ThreadPoolExecutor(max_workers=session_config.inference_workers, thread_name_prefix="inference")
+
+
+async def run_inference(fn: Callable[..., T], *args, **kwargs) -> T:
+    """Run CPU bound inference on the dedicated inference executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(fn, *args, **kwargs))
+
+
+def session_options(optimized: bool = False) -> ort.SessionOptions:
+    session_opts = ort.SessionOptions()
+    session_opts.graph_optimization_level = (
+        ort.GraphOptimizationLevel.ORT_DISABLE_ALL if optimized else ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    )
+    session_opts.intra_op_num_threads = session_config.intra_op_threads
+    session_opts.inter_op_num_threads = session_config.inter_op_threads
+    session_opts.execution_mode = (
+        ort.ExecutionMode.ORT_PARALLEL
+        if session_config.execution_mode == "parallel"
+        else ort.ExecutionMode.ORT_SEQUENTIAL
+    )
+    session_opts.enable_cpu_mem_arena = session_config.cpu_mem_arena
+    session_opts.enable_mem_pattern = session_config.mem_pattern
+    spinning = "1" if session_config.allow_spinning else "0"
+    session_opts.add_session_config_entry("session.intra_op.allow_spinning", spinning)
+    session_opts.add_session_config_entry("session.inter_op.allow_spinning", spinning)
+    return session_opts
+
+
+def create_session(model_path: str) -> ort.InferenceSession:
+    """Create inference session, preferring the graph optimized offline at image build time."""
+    optimized_path = Path(model_path).with_suffix(".opt.onnx")
+    if session_config.optimized_model and optimized_path.exists():
+        return ort.InferenceSession(str(optimized_path), session_options(optimized=True))
+    return ort.InferenceSession(model_path, session_options())
+
+
+def model_file(model_id: str, filename: str) -> str | None:
+    """Path of cached model file, None if it wasn't published for this model.
+
+    model_id may also be a local directory laid out like a hub repo, e.g. the benchmark's stand-in models.
+    """
+    if Path(model_id).is_dir():
+        path = Path(model_id) / filename
+        return str(path) if path.exists() else None
+    try:
+        return hf_hub_download(model_id, filename, local_files_only=True)
+    except EntryNotFoundError:
+        return None
+
+
+def token_model(model_id: str) -> str:
+    """model_id@revision of the cached hub snapshot, as recorded by the pipeline with cached token ids.
+
+    Local directories have no revision and are identified by their path alone.
+    """
+    if Path(model_id).is_dir():
+        return model_id
+    return f"{model_id}@{Path(snapshot_download(model_id, local_files_only=True)).name}"
+
+
+def session_inputs(session: ort.InferenceSession, inputs: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    """Tokenizer outputs the model declares as inputs, not every model takes token_type_ids."""
+    names = {model_input.name for model_input in session.get_inputs()}
+    return {key: value for key, value in inputs.items() if key in names}
+
+
+def output_error(outputs: np.ndarray, reference: np.ndarray) -> float:
+    """Drift of a model variant's outputs from the fp32 reference outputs.
+
+    Embeddings are compared row by row, relative to the reference norm. Scalar scores such as ranker logits
+    are compared by absolute error relative to the spread of the reference scores (at least one logit),
+    since a per-row ratio blows up for logits near 0 while only their order matters.
+    """
+    outputs = np.asarray(outputs, dtype=np.float32)
+    reference = np.asarray(reference, dtype=np.float32)
+    if reference.ndim == 1 or reference.shape[-1] == 1:
+        outputs, reference = outputs.reshape(-1), reference.reshape(-1)
+        return float(np.abs(outputs - reference).max() / max(float(np.ptp(reference)), 1.0))
+    norm = np.maximum(np.linalg.norm(reference, axis=-1), 1e-9)
+    return float((np.linalg.norm(outputs - reference, axis=-1) / norm).max())
+
+
+def load_session(model_id: str, sample_inputs: dict[str, np.ndarray]) -> ort.InferenceSession:
+    """Load the preferred model variant if its outputs stay within tolerance of the FP32 reference."""
+    variants = ["int8", "fp16"] if MODEL_VARIANT == "auto" else [MODEL_VARIANT]
+    reference = None
+    for variant in variants:
+        if variant == "fp32":
+            break
+        path = model_file(model_id, MODEL_FILES[variant])
+        if path is None:
+            continue
+        try:
+            session = create_session(path)
+            if reference is None:
+                reference = create_session(model_file(model_id, "model.onnx"))
+            error = output_error(
+                session.run(None, session_inputs(session, sample_inputs))[0],
+                reference.run(None, session_inputs(reference, sample_inputs))[0],
+            )
+        except Exception as err:
+            logger.warning(f"{model_id}: could not load {variant} variant ({err}).")
+            continue
+        if error <= MODEL_VARIANT_TOLERANCE:
+            logger.info(f"{model_id}: using {variant} variant (error {error:.4f}).")
+            return session
+        logger.warning(f"{model_id}: {variant} variant drifted from fp32 (error {error:.4f}).")
+
+    logger.info(f"{model_id}: using fp32 model.")
+    return reference or create_session(model_file(model_id, "model.onnx"))
+
+
+def load_tokenizer(model_id: str) -> Tokenizer:
+    """Rust tokenizer from the model's tokenizer.json, converted by transformers if none was published."""
+    path = model_file(model_id, "tokenizer.json")
+    if path is not None:
+        return Tokenizer.from_file(path)
+    try:
+        from transformers import AutoTokenizer
+    except ImportError as err:
+        raise RuntimeError(f"{model_id} has no tokenizer.json, install backend[transformers].") from err
+    return AutoTokenizer.from_pretrained(model_id).backend_tokenizer
+
+
+class FastTokenizer:
+    """`tokenizers` tokenizer with truncation, and optionally padding, configured once on load.
+
+    Reads model_max_length and pad_token from tokenizer_config.json so outputs match the transformers
+    tokenizer the models were trained with.
+    """
+
+    def __init__(self, model_id: str, padding: bool = True) -> None:
+        path = model_file(model_id, "tokenizer_config.json")
+        config = json.loads(Path(path).read_text()) if path is not None else {}
+        pad_token = config.get("pad_token") or "[PAD]"
+        pad_token = pad_token["content"] if isinstance(pad_token, dict) else pad_token
+
+        self.tokenizer = load_tokenizer(model_id)
+        max_length = int(config.get("model_max_length", TOKENIZER_MAX_LENGTH))
+        self.model_max_length = min(max_length, TOKENIZER_MAX_LENGTH)
+        self.pad_token_id = self.tokenizer.token_to_id(pad_token) or 0
+        self.tokenizer.enable_truncation(max_length=self.model_max_length)
+        if padding:
+            self.tokenizer.enable_padding(pad_id=self.pad_token_id, pad_token=pad_token)
+        else:
+            self.tokenizer.no_padding()
+
+    def __call__(self, texts: list[str], pairs: list[str] | None = None) -> dict[str, np.ndarray]:
+        """Encode a padded batch of texts, or of (text, pair) pairs, into model input tensors."""
+        encodings = self.tokenizer.encode_batch(texts if pairs is None else list(zip(texts, pairs)))
+        return {
+            "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+            "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64),
+            "attention_mask": np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64),
+        }
+
+    def encode_pairs(self, texts: list[str], pairs: list[str]) -> list[dict[str, list[int]]]:
+        """Encode (text, pair) pairs into unpadded per-pair features."""
+        return [
+            {
+                "input_ids": encoding.ids,
+                "token_type_ids": encoding.type_ids,
+                "attention_mask": encoding.attention_mask,
+            }
+            for encoding in self.tokenizer.encode_batch(list(zip(texts, pairs)))
+        ]
+
+    def encode_ids(self, text: str) -> list[int]:
+        """Token ids of text without special tokens."""
+        return self.tokenizer.encode(text, add_special_tokens=False).ids
+
+    def num_special_tokens_to_add(self, pair: bool) -> int:
+        processor = self.tokenizer.post_processor
+        return 0 if processor is None else processor.num_special_tokens_to_add(pair)
+
+    def pair_template(self) -> list[tuple[int | None, int, int]]:
+        """Pair layout from the post processor as (sequence, token id, type id), sequence None for specials.
+
+        Lets pairs be assembled from token ids cached in the index exactly as the tokenizer would.
+        """
+        encoding = self.tokenizer.encode(["a"], ["b"], is_pretokenized=True)
+        template = []
+        for sequence, token_id, type_id in zip(encoding.sequence_ids, encoding.ids, encoding.type_ids):
+            if sequence is None or len(template) == 0 or template[-1][0] != sequence:
+                template.append((sequence, token_id, type_id))
+        return template
+
+
+def warmup_text(length: int) -> str:
+    """Text which tokenizes to roughly length tokens."""
+    words = SELF_CHECK_PASSAGE.split()
+    return " ".join(words[i % len(words)] for i in range(max(1, length)))
+
+
+class ONNXRetriever:
+    """Query encoder. The tokenizer loads on construction, the ONNX session on `load`.
+
+    Sessions own thread pools which don't survive a fork, so they are created in each worker process
+    after the app has been preloaded, while tokenizers and everything else are shared copy-on-write.
+    """
+
+    def __init__(self, model_id: str) -> None:
+        self.model_id = model_id
+        self.tokenizer = FastTokenizer(model_id, padding=True)
+        self.encoder: ort.InferenceSession | None = None
+
+    def load(self) -> None:
+        if self.encoder is None:
+            self.encoder = load_session(self.model_id, self.tokenizer(SELF_CHECK_QUERIES))
+
+    def warmup(self, batch_size: int, lengths: list[int] = WARMUP_LENGTHS) -> None:
+        """Encode single queries and full batches at each length."""
+        for length in lengths:
+            query = warmup_text(length)
+            self.embed([query])
+            self.embed([query] * batch_size)
+
+    def __call__(self, query: str) -> list[float]:
+        """Create embedding for user query."""
+        return self.embed([query])[0].tolist()
+
+    def embed(self, queries: list[str]) -> list[np.ndarray]:
+        """Create embeddings for a padded batch of user queries."""
+        with timer("retriever_tokenize"):
+            tokens = self.tokenizer(queries)
+        with timer("retriever_encode"):
+            embeddings = self.encoder.run(None, session_inputs(self.encoder, tokens))
+        return list(np.atleast_2d(embeddings[0]).astype(np.float32, copy=False))
+
+
+def rank(scores: np.ndarray, num_results: int) -> tuple[list[int], list[float]]:
+    """Indicies of the num_results highest scores, best first, and their scores.
+
+    Partial selection is O(n) in the number of candidates, only the selected k are sorted. Tied scores
+    keep candidate order.
+    """
+    k = min(num_results, len(scores))
+    if k == 0:
+        return [], []
+    top = np.sort(np.argpartition(-scores, k - 1)[:k])
+    top = top[np.argsort(-scores[top], kind="stable")]
+    return top.tolist(), scores[top].tolist()
+
+
+def truncate_pair(first: list[int], second: list[int], max_tokens: int) -> tuple[list[int], list[int]]:
+    """Trim the longest sequence first until the pair fits, matching the tokenizer's default truncation."""
+    first_len, second_len = len(first), len(second)
+    while first_len + second_len > max_tokens:
+        if first_len > second_len:
+            first_len -= 1
+        else:
+            second_len -= 1
+    return first[:first_len], second[:second_len]
+
+
+class ONNXRanker:
+    """Cross-encoder. The tokenizer loads on construction, the ONNX session on `load` (see ONNXRetriever)."""
+
+    def __init__(self, model_id: str, bucket_size: int = 32) -> None:
+        self.tokenizer = FastTokenizer(model_id, padding=False)
+        self.ranker: ort.InferenceSession | None = None
+        self.model_id = model_id
+        self.token_model = token_model(model_id)
+        self.bucket_size = bucket_size
+        self.max_pair_tokens = self.tokenizer.model_max_length - self.tokenizer.num_special_tokens_to_add(
+            pair=True
+        )
+        self.pair_template = self.tokenizer.pair_template()
+
+    def load(self) -> None:
+        if self.ranker is None:
+            features = self.tokenizer.encode_pairs(
+                SELF_CHECK_QUERIES, [SELF_CHECK_PASSAGE] * len(SELF_CHECK_QUERIES)
+            )
+            self.ranker = load_session(self.model_id, self.pad(features))
+
+    def warmup(self, lengths: list[int] = WARMUP_LENGTHS) -> None:
+        """Score a full bucket of pairs at each length."""
+        query = SELF_CHECK_QUERIES[0]
+        for length in lengths:
+            candidates = [warmup_text(length)] * self.bucket_size
+            self.score_requests([(query, candidates)])
+
+    def __call__(self, query: str, candidates: list[str], num_results: int) -> tuple[list[int], list[float]]:
+        """Reranks candidate documents against query. Returns ranked indicies and their scores."""
+        scores = self.score_requests([(query, candidates)])[0]
+        return rank(scores, num_results)
+
+    def candidate(self, payload: dict) -> str | np.ndarray:
+        """Candidate token ids cached in the index by the pipeline, falling back to the raw text."""
+        if payload.get("token_model") != self.token_model or payload.get("token_ids") is None:
+            return payload["text"]
+        return np.frombuffer(base64.b64decode(payload["token_ids"]), dtype="<i4")
+
+    def score_requests(self, requests: list[tuple[str, list[str | np.ndarray]]]) -> list[np.ndarray]:
+        """Score the (query, candidate) pairs of several requests together. Returns scores per request."""
+        with timer("ranker_tokenize"):
+            features = [feature for query, docs in requests for feature in self.tokenize(query, docs)]
+        with timer("ranker_score"):
+            scores = self.score_features(features)
+        return np.split(scores, np.cumsum([len(candidates) for _, candidates in requests])[:-1])
+
+    def tokenize(self, query: str, candidates: list[str | np.ndarray]) -> list[dict[str, list[int]]]:
+        """Tokenize (query, candidate) pairs. Candidates given as cached token ids skip the tokenizer."""
+        features = [None] * len(candidates)
+
+        texts = [i for i, candidate in enumerate(candidates) if isinstance(candidate, str)]
+        if len(texts) > 0:
+            pairs = self.tokenizer.encode_pairs([query] * len(texts), [candidates[i] for i in texts])
+            for i, feature in zip(texts, pairs):
+                features[i] = feature
+
+        cached = [i for i, candidate in enumerate(candidates) if not isinstance(candidate, str)]
+        if len(cached) > 0:
+            query_ids = self.tokenizer.encode_ids(query)
+            for i in cached:
+                features[i] = self.build_pair(query_ids, candidates[i].tolist())
+
+        return features
+
+    def build_pair(self, query_ids: list[int], candidate_ids: list[int]) -> dict[str, list[int]]:
+        """Assemble model inputs for a pair from token ids, as the tokenizer would for the raw texts."""
+        sequences = truncate_pair(query_ids, candidate_ids, self.max_pair_tokens)
+        input_ids, token_type_ids = [], []
+        for sequence, token_id, type_id in self.pair_template:
+            ids = [token_id] if sequence is None else sequences[sequence]
+            input_ids.extend(ids)
+            token_type_ids.extend([type_id] * len(ids))
+        attention_mask = [1] * len(input_ids)
+        return {"input_ids": input_ids, "token_type_ids": token_type_ids, "attention_mask": attention_mask}
+
+    def score_features(self, features: list[dict[str, list[int]]]) -> np.ndarray:
+        """Score tokenized pairs in length-bucketed batches so padding stays close to each pair's length."""
+        scores = np.empty(len(features), dtype=np.float32)
+        order = np.argsort([len(feature["input_ids"]) for feature in features], kind="stable")
+        for start in range(0, len(order), self.bucket_size):
+            bucket = order[start : start + self.bucket_size]
+            inputs = self.pad([features[i] for i in bucket])
+            logits = self.ranker.run(None, session_inputs(self.ranker, inputs))
+            scores[bucket] = logits[0].reshape(-1)
+        return scores
+
+    def pad(self, features: list[dict[str, list[int]]]) -> dict[str, np.ndarray]:
+        """Right pad tokenized pairs into model input tensors."""
+        length = max(len(feature["input_ids"]) for feature in features)
+        inputs = {}
+        for key in features[0]:
+            fill = self.tokenizer.pad_token_id if key == "input_ids" else 0
+            tensor = np.full((len(features), length), fill, dtype=np.int64)
+            for row, feature in enumerate(features):
+                tensor[row, : len(feature[key])] = feature[key]
+            inputs[key] = tensor
+        return inputs
@@ -0,0 +1,83 @@
+import re
+import zlib
+from collections import Counter
+
+import numpy as np
+from qdrant_client.http import models
+
+# Term hashing and weighting must match the pipeline's lexical_index asset.
+TERM = re.compile(r"\w+")
+LEXICAL_VECTOR = "lexical"
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Average terms per ~30s merged segment. Fixed so documents are weighted the same whichever index holds them.
+BM25_AVG_TERMS = 80
+RRF_K = 60
+
+
+def terms(text: str) -> list[str]:
+    """Lowercased word terms. Underscores are word characters, so identifiers like fine_tune stay whole."""
+    return TERM.findall(text.lower())
+
+
+def term_index(term: str) -> int:
+    return zlib.crc32(term.encode("utf8"))
+
+
+def query_vector(query: str) -> models.SparseVector:
+    """Sparse query vector, one per distinct term. Qdrant applies IDF to the matching document weights."""
+    indices = sorted({term_index(term) for term in terms(query)})
+    return models.SparseVector(indices=indices, values=[1.0] * len(indices))
+
+
+def reciprocal_rank_fusion(rankings: list[list[models.ScoredPoint]], limit: int) -> list[models.ScoredPoint]:
+    """Fuse ranked candidate lists by summing 1 / (RRF_K + rank), keeping the first payload of each point."""
+    fused: dict[int | str, float] = {}
+    points: dict[int | str, models.ScoredPoint] = {}
+    for ranking in rankings:
+        for position, point in enumerate(ranking):
+            fused[point.id] = fused.get(point.id, 0.0) + 1 / (RRF_K + position + 1)
+            points.setdefault(point.id, point)
+    ranked = sorted(fused, key=fused.get, reverse=True)[:limit]
+    return [points[point_id].model_copy(update={"score": fused[point_id]}) for point_id in ranked]
+
+
+class LexicalIndex:
+    """In-memory BM25 inverted index, the embedded index's counterpart of the Qdrant sparse collection.
+
+    Scores match the sparse collection's: term weights use the fixed BM25_AVG_TERMS and IDF matches
+    Qdrant's IDF modifier.
+    """
+
+    def __init__(self, texts: list[str]) -> None:
+        counts = [Counter(terms(text)) for text in texts]
+        lengths = np.array([sum(count.values()) for count in counts], dtype=np.float32)
+        norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths / BM25_AVG_TERMS)
+
+        postings: dict[str, tuple[list[int], list[float]]] = {}
+        for row, count in enumerate(counts):
+            for term, tf in count.items():
+                rows, weights = postings.setdefault(term, ([], []))
+                rows.append(row)
+                weights.append(tf * (BM25_K1 + 1) / (tf + norms[row]))
+
+        self.size = len(texts)
+        self.postings = {}
+        for term, (rows, weights) in postings.items():
+            idf = np.log(1 + (self.size - len(rows) + 0.5) / (len(rows) + 0.5))
+            self.postings[term] = (np.array(rows), np.array(weights, dtype=np.float32) * idf)
+
+    def top_k(self, query: str, limit: int) -> tuple[np.ndarray, np.ndarray]:
+        """Rows and BM25 scores of the best matching texts, best first."""
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(terms(query)):
+            if term in self.postings:
+                rows, weights = self.postings[term]
+                scores[rows] += weights
+        matched = np.flatnonzero(scores)
+        if len(matched) == 0:
+            return matched, scores[matched]
+        limit = min(limit, len(matched))
+        top = matched[np.argpartition(-scores[matched], limit - 1)[:limit]]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return top, scores[top]
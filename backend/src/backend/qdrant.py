@@ -0,0 +1,153 @@
+import asyncio
+import os
+import queue
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Callable, Iterator
+
+import grpc
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.http.exceptions import ResponseHandlingException
+
+QDRANT_HOST = os.getenv("QDRANT_HOST")
+QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
+# Alias the pipeline flips to a new versioned collection once a reindex for new model weights is complete.
+QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION")
+# Single point collection whose payload version is bumped by the pipeline each time the index changes.
+QDRANT_VERSION_COLLECTION = f"{QDRANT_COLLECTION}_version"
+# Sparse BM25 term vectors of the same points, written by the pipeline's lexical_index asset.
+QDRANT_LEXICAL_COLLECTION = f"{QDRANT_COLLECTION}_lexical"
+# Clients (gRPC channels) per worker. Sync clients are checked out exclusively, async ones are shared.
+QDRANT_POOL_SIZE = int(os.getenv("QDRANT_POOL_SIZE", "4"))
+QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", "5"))
+QDRANT_KEEPALIVE_MS = int(os.getenv("QDRANT_KEEPALIVE_MS", "30000"))
+
+# Errors which indicate the underlying channel is broken and the client should be rebuilt. Other gRPC
+# status codes (NOT_FOUND, INVALID_ARGUMENT, DEADLINE_EXCEEDED, ...) come over a healthy channel.
+CONNECTION_ERRORS = (ResponseHandlingException, ConnectionError)
+CONNECTION_STATUS_CODES = {grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.CANCELLED, grpc.StatusCode.UNKNOWN}
+
+
+def is_connection_error(err: Exception) -> bool:
+    if isinstance(err, grpc.RpcError):
+        return callable(getattr(err, "code", None)) and err.code() in CONNECTION_STATUS_CODES
+    return isinstance(err, CONNECTION_ERRORS)
+
+
+def client_options() -> dict:
+    """Connection options shared by sync and async Qdrant clients."""
+    return {
+        "host": QDRANT_HOST,
+        "api_key": QDRANT_API_KEY,
+        "prefer_grpc": True,
+        "https": (QDRANT_API_KEY is not None and QDRANT_API_KEY != ""),
+        "timeout": QDRANT_TIMEOUT,
+        "grpc_options": {
+            "grpc.keepalive_time_ms": QDRANT_KEEPALIVE_MS,
+            "grpc.keepalive_timeout_ms": min(QDRANT_KEEPALIVE_MS, 10_000),
+            "grpc.keepalive_permit_without_calls": 1,
+            "grpc.http2.max_pings_without_data": 0,
+        },
+    }
+
+
+def create_client() -> QdrantClient:
+    return QdrantClient(**client_options())
+
+
+def create_async_client() -> AsyncQdrantClient:
+    return AsyncQdrantClient(**client_options())
+
+
+async def resolve_alias(pool: "AsyncQdrantPool", name: str) -> str:
+    """Collection behind alias name, name itself when it isn't an alias."""
+    async with pool.client() as client:
+        response = await client.get_aliases()
+    for alias in response.aliases:
+        if alias.alias_name == name:
+            return alias.collection_name
+    return name
+
+
+class QdrantPool:
+    """Fixed size pool of warm Qdrant clients.
+
+    Clients broken by a connection error are closed on release and their slot is refilled on next use, so a
+    closed client never goes back into the pool.
+    """
+
+    def __init__(self, size: int = QDRANT_POOL_SIZE, factory: Callable[[], QdrantClient] = create_client):
+        self.factory = factory
+        self.clients: queue.Queue[QdrantClient | None] = queue.Queue(maxsize=size)
+        for _ in range(size):
+            self.clients.put(factory())
+
+    @contextmanager
+    def client(self) -> Iterator[QdrantClient]:
+        client = self.clients.get()
+        try:
+            if client is None:
+                client = self.factory()
+            yield client
+        except Exception as err:
+            if client is not None and is_connection_error(err):
+                self.discard(client)
+                client = None
+            raise
+        finally:
+            self.clients.put(client)
+
+    def discard(self, client: QdrantClient) -> None:
+        try:
+            client.close()
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        while not self.clients.empty():
+            client = self.clients.get_nowait()
+            if client is not None:
+                client.close()
+
+
+class AsyncQdrantPool:
+    """Warm async Qdrant clients handed out round-robin.
+
+    Unlike QdrantPool, clients are shared rather than checked out: each client's gRPC channel multiplexes
+    concurrent calls, so a request never waits for a free client. A client broken by a connection error is
+    closed and its slot refilled on next use, calls still in flight on it fail like the one that broke it.
+    """
+
+    def __init__(
+        self, size: int = QDRANT_POOL_SIZE, factory: Callable[[], AsyncQdrantClient] = create_async_client
+    ):
+        self.factory = factory
+        self.clients: list[AsyncQdrantClient | None] = [factory() for _ in range(size)]
+        self.next = 0
+
+    @asynccontextmanager
+    async def client(self) -> AsyncIterator[AsyncQdrantClient]:
+        slot = self.next
+        self.next = (slot + 1) % len(self.clients)
+        client = self.clients[slot]
+        if client is None:
+            client = self.clients[slot] = self.factory()
+        try:
+            yield client
+        except Exception as err:
+            # Concurrent calls may see the same broken channel, only the first replaces it.
+            if is_connection_error(err) and self.clients[slot] is client:
+                self.clients[slot] = None
+                await self.discard(client)
+            raise
+
+    async def discard(self, client: AsyncQdrantClient) -> None:
+        try:
+            await client.close()
+        except Exception:
+            pass
+
+    async def close(self) -> None:
+        clients, self.clients = self.clients, [None] * len(self.clients)
+        for client in clients:
+            if client is not None:
+                await client.close()
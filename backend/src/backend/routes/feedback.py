@@ -1,14 +1,20 @@
 from datetime import datetime
 from enum import IntEnum
+from typing import Annotated
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Body, HTTPException, status
 from pydantic import BaseModel
-from sqlalchemy import text
 
-from backend.database import engine
+from backend.writer import BufferedWriter
+
+MAX_FEEDBACK_BATCH = 100
 
 router = APIRouter()
 
+feedback_log = BufferedWriter(
+    table="fastsearch.feedback", columns=["query", "result_id", "feedback", "timestamp"]
+)
+
 
 class Relevance(IntEnum):
     pos = 1
@@ -21,26 +27,35 @@ class Feedback(BaseModel):
     result_id: str
 
 
-@router.post("/feedback", status_code=204)
-def feedback(req: Feedback) -> None:
-    """Insert search result feedback into feedback db."""
+def submit_feedback(reqs: list[Feedback]) -> None:
+    """Queue search result feedback for a bulk insert into feedback db.
+
+    A batch is queued whole or rejected whole, so a client retrying after a 503 never writes rows twice.
+    """
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with engine.connect() as conn:
-        result = conn.execute(
-            text("""\
-            INSERT INTO fastsearch.feedback (query, result_id, feedback, timestamp)
-            VALUES (:query, :result_id, :feedback, :timestamp);
-            """),
-            {
-                "query": req.query,
-                "result_id": req.result_id,
-                "feedback": req.feedback.value,
-                "timestamp": timestamp,
-            },
-        )
-        conn.commit()
-    if result.rowcount != 1:
+    rows = [
+        {
+            "query": req.query,
+            "result_id": req.result_id,
+            "feedback": req.feedback.value,
+            "timestamp": timestamp,
+        }
+        for req in reqs
+    ]
+    if not feedback_log.submit_many(rows):
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="could not submit feedback.",
         )
+
+
+@router.post("/feedback", status_code=204)
+async def feedback(req: Feedback) -> None:
+    """Insert search result feedback into feedback db."""
+    submit_feedback([req])
+
+
+@router.post("/feedback/batch", status_code=204)
+async def feedback_batch(reqs: Annotated[list[Feedback], Body(max_length=MAX_FEEDBACK_BATCH)]) -> None:
+    """Insert feedback for a page of search results into feedback db."""
+    submit_feedback(reqs)
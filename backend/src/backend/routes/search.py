@@ -1,65 +1,98 @@
+import asyncio
+import json
 import os
+import time
 from datetime import datetime
 
-import onnxruntime as ort
-import transformers
-from fastapi import APIRouter, BackgroundTasks
-from huggingface_hub import hf_hub_download
+import numpy as np
+from fastapi import APIRouter, Request
 from pydantic import BaseModel
-from qdrant_client import QdrantClient
 from qdrant_client.http import models
-from sqlalchemy import text
-from transformers import AutoTokenizer
 
-from backend.database import engine
+from backend.batching import MicroBatcher
+from backend.cache import RESULT_CACHE_URL, EmbeddingCache, ResultCache, create_store
+from backend.index import EMBEDDED_INDEX_METHOD, SEARCH_INDEX, VectorIndex
+from backend.inference import MODEL_VARIANT, ONNXRanker, ONNXRetriever, rank, token_model
+from backend.lexical import reciprocal_rank_fusion
+from backend.metrics import Counter, register, timer
+from backend.tuning import SearchTier, load_tuner
+from backend.writer import BufferedWriter
 
-transformers.logging.set_verbosity_error()
-
-QDRANT_HOST = os.getenv("QDRANT_HOST")
-QDRANT_API_KEY = os.getenv("QDRANT_API_KEY")
-QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION")
 NUM_CANDIDATES = int(os.getenv("NUM_CANDIDATES"))
 NUM_RESULTS = int(os.getenv("NUM_RESULTS"))
-
-
-class ONNXRetriever:
-    def __init__(self, model_id: str) -> None:
-        session_opts = ort.SessionOptions()
-        session_opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
-        model_path = hf_hub_download(model_id, "model.onnx", local_files_only=True)
-        self.encoder = ort.InferenceSession(model_path, session_opts)
-        self.tokenizer = AutoTokenizer.from_pretrained(model_id)
-
-    def __call__(self, query: str) -> list[float]:
-        """Create embedding for user query."""
-        tokens = self.tokenizer(query, return_tensors="np", truncation=True)
-        embedding = self.encoder.run(None, dict(**tokens))
-        return embedding[0].tolist()
-
-
-class ONNXRanker:
-    def __init__(self, model_id: str) -> None:
-        session_opts = ort.SessionOptions()
-        session_opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
-        model_path = hf_hub_download(model_id, "model.onnx", local_files_only=True)
-        self.ranker = ort.InferenceSession(model_path, session_opts)
-        self.tokenizer = AutoTokenizer.from_pretrained(model_id)
-
-    def __call__(self, query: str, candidates: list[str], num_results: int) -> list[int]:
-        """Reranks candidate documents against query. Returns list of ranked indicies."""
-        tokens = self.tokenizer(
-            [query for _ in range(len(candidates))],
-            candidates,
-            return_tensors="np",
-            padding=True,
-            truncation=True,
-        )
-        scores = self.ranker.run(None, dict(**tokens))
-        return scores[0].argsort().tolist()[:num_results]
-
-
-retriever = ONNXRetriever(model_id=os.getenv("RETRIEVER_MODEL"))
-ranker = ONNXRanker(model_id=os.getenv("RANKING_MODEL"))
+RETRIEVER_BATCH_SIZE = int(os.getenv("RETRIEVER_BATCH_SIZE", "32"))
+RETRIEVER_BATCH_WAIT_MS = float(os.getenv("RETRIEVER_BATCH_WAIT_MS", "2"))
+RANKER_BATCH_SIZE = int(os.getenv("RANKER_BATCH_SIZE", "8"))
+RANKER_BATCH_WAIT_MS = float(os.getenv("RANKER_BATCH_WAIT_MS", "2"))
+RANKER_BUCKET_SIZE = int(os.getenv("RANKER_BUCKET_SIZE", "32"))
+# Cascade reranking: "full" always scores every candidate, "cascade" may skip or stop reranking early.
+RERANK_MODE = os.getenv("RERANK_MODE", "full")
+# Retriever score margin of the top candidate above which the cascade skips the cross-encoder. Never applies
+# in hybrid mode, where candidate scores are reciprocal rank fusion scores rather than similarities.
+RERANK_SKIP_MARGIN = float(os.getenv("RERANK_SKIP_MARGIN", "0.15"))
+RERANK_CHUNK_SIZE = int(os.getenv("RERANK_CHUNK_SIZE", "10"))
+# Drop results the cross-encoder scores below this, unset keeps every result.
+RERANK_MIN_SCORE = float(os.getenv("RERANK_MIN_SCORE")) if os.getenv("RERANK_MIN_SCORE") else None
+# Hybrid retrieval: fuse BM25 candidates with dense candidates by reciprocal rank before reranking.
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "false").lower() == "true"
+LEXICAL_CANDIDATES = int(os.getenv("LEXICAL_CANDIDATES", "20"))
+
+RERANK_EXIT = register(Counter("fastsearch_rerank_exit_total", "Rerank stage exits by kind.", ("exit",)))
+
+
+# Payload fetched with every candidate for reranking, and the display fields fetched for final results only.
+RERANK_FIELDS = ["text", "token_ids", "token_model"]
+DISPLAY_FIELDS = ["video_id", "title", "start", "thumbnail", "lesson", "forum", "course"]
+
+RETRIEVER_MODEL = os.getenv("RETRIEVER_MODEL")
+RANKING_MODEL = os.getenv("RANKING_MODEL")
+
+
+retriever = ONNXRetriever(model_id=RETRIEVER_MODEL)
+ranker = ONNXRanker(model_id=RANKING_MODEL, bucket_size=RANKER_BUCKET_SIZE)
+
+retriever_batcher = MicroBatcher(
+    "retriever", retriever.embed, max_batch_size=RETRIEVER_BATCH_SIZE, max_wait_ms=RETRIEVER_BATCH_WAIT_MS
+)
+ranker_batcher = MicroBatcher(
+    "ranker", ranker.score_requests, max_batch_size=RANKER_BATCH_SIZE, max_wait_ms=RANKER_BATCH_WAIT_MS
+)
+
+tuner = load_tuner(num_candidates=NUM_CANDIDATES)
+
+# Every setting which changes search results is part of the result cache keys, so deployments configured
+# differently never serve each other's results from a shared store. Models are keyed on their revision, so
+# weights updated under the same model id invalidate results on redeploy.
+RESULT_SETTINGS = {
+    "retriever": token_model(RETRIEVER_MODEL),
+    "ranker": ranker.token_model,
+    "num_candidates": NUM_CANDIDATES,
+    "num_results": NUM_RESULTS,
+    "model_variant": MODEL_VARIANT,
+    "rerank_mode": RERANK_MODE,
+    "rerank_skip_margin": RERANK_SKIP_MARGIN,
+    "rerank_chunk_size": RERANK_CHUNK_SIZE,
+    "rerank_min_score": RERANK_MIN_SCORE,
+    "search_tuning": tuner.settings(),
+    "search_index": SEARCH_INDEX,
+    "embedded_index_method": EMBEDDED_INDEX_METHOD,
+    "hybrid_search": HYBRID_SEARCH,
+    "lexical_candidates": LEXICAL_CANDIDATES,
+}
+
+result_cache = ResultCache(
+    namespace=json.dumps(RESULT_SETTINGS, sort_keys=True), shared=create_store(RESULT_CACHE_URL)
+)
+embedding_cache = EmbeddingCache()
+query_log = BufferedWriter(table="fastsearch.queries", columns=["query", "timestamp"])
+
+
+def load_models() -> None:
+    """Create inference sessions and warm them up at representative batch sizes and sequence lengths."""
+    retriever.load()
+    ranker.load()
+    retriever.warmup(batch_size=RETRIEVER_BATCH_SIZE)
+    ranker.warmup()
 
 
 router = APIRouter()
@@ -78,44 +111,111 @@ class Result(BaseModel):
 
 
 def log_search(query: str) -> None:
-    """Insert user query into feedback db."""
+    """Queue user query for insertion into feedback db."""
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with engine.connect() as conn:
-        conn.execute(
-            "INSERT INTO fastsearch.queries (query, timestamp) VALUES (:query, :timestamp);",
-            {"query": query, "timestamp": timestamp},
-        )
-        conn.commit()
+    query_log.submit({"query": query, "timestamp": timestamp})
+
+
+async def embed(query: str) -> list[float]:
+    """Embed query, skipping the encoder for queries seen before (up to normalization)."""
+    embedding = embedding_cache.get(query)
+    if embedding is None:
+        embedding = await retriever_batcher.submit(query)
+        embedding_cache.set(query, embedding)
+    return embedding.tolist()
+
+
+def threshold(ranked: list[int], scores: list[float] | None) -> list[int]:
+    """Drop ranked candidates the cross-encoder scored below RERANK_MIN_SCORE."""
+    if RERANK_MIN_SCORE is None or scores is None:
+        return ranked
+    return [i for i, score in zip(ranked, scores) if score >= RERANK_MIN_SCORE]
+
+
+async def rerank(query: str, candidates: list[models.ScoredPoint]) -> tuple[list[int], list[float] | None]:
+    """Rerank candidates with the cross-encoder. Returns ranked candidate indicies and their ranker scores,
+    scores are None when the cross-encoder was skipped.
+    """
+    documents = [ranker.candidate(c.payload) for c in candidates]
+    if RERANK_MODE != "cascade":
+        RERANK_EXIT.inc(exit="full")
+        return rank(await ranker_batcher.submit((query, documents)), NUM_RESULTS)
+
+    # Skip the cross-encoder entirely when the retriever is already decisive about the top candidate.
+    # RRF scores are not similarities, so the margin only applies to dense retrieval.
+    if len(candidates) < 2 or (
+        not HYBRID_SEARCH and candidates[0].score - candidates[1].score >= RERANK_SKIP_MARGIN
+    ):
+        RERANK_EXIT.inc(exit="skip")
+        return list(range(min(NUM_RESULTS, len(candidates)))), None
+
+    # Score candidates in retriever order, chunk by chunk, until the top results stop changing.
+    scores = np.empty(0, dtype=np.float32)
+    ranked, ranked_scores = None, None
+    for start in range(0, len(documents), RERANK_CHUNK_SIZE):
+        chunk = documents[start : start + RERANK_CHUNK_SIZE]
+        scores = np.concatenate([scores, await ranker_batcher.submit((query, chunk))])
+        previous = ranked
+        ranked, ranked_scores = rank(scores, NUM_RESULTS)
+        if ranked == previous and len(scores) < len(documents):
+            RERANK_EXIT.inc(exit="early")
+            return ranked, ranked_scores
+    RERANK_EXIT.inc(exit="full")
+    return ranked, ranked_scores
+
+
+async def retrieve(
+    index: VectorIndex, query: str, embedding: list[float], tier: SearchTier
+) -> list[models.ScoredPoint]:
+    """Dense candidates, fused with lexical candidates in hybrid mode, up to the tier's candidate count."""
+    dense = index.search(embedding, limit=tier.num_candidates, hnsw_ef=tier.hnsw_ef, fields=RERANK_FIELDS)
+    if not HYBRID_SEARCH:
+        return await dense
+    lexical = index.search_lexical(query, limit=LEXICAL_CANDIDATES, fields=RERANK_FIELDS)
+    return reciprocal_rank_fusion(await asyncio.gather(dense, lexical), limit=tier.num_candidates)
 
 
 @router.get("/search")
-def search(query: str, tasks: BackgroundTasks) -> list[Result]:
+async def search(query: str, request: Request) -> list[Result]:
     """Find lecture segments relevant to user query."""
-    tasks.add_task(log_search, query=query)
-
-    client = QdrantClient(
-        host=QDRANT_HOST,
-        api_key=QDRANT_API_KEY,
-        prefer_grpc=True,
-        https=(QDRANT_API_KEY is not None and QDRANT_API_KEY != ""),
-    )
+    start = time.perf_counter()
+    log_search(query)
+
+    with timer("cache"):
+        cache_key = result_cache.key(query, await request.app.state.index.version())
+        cached = await result_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
     # Stage: Retrival
-    sentence_embed = retriever(query)
-    candidates = client.search(
-        collection_name=QDRANT_COLLECTION,
-        search_params=models.SearchParams(hnsw_ef=len(sentence_embed), exact=False),
-        query_vector=sentence_embed,
-        limit=NUM_CANDIDATES,
-    )
+    with timer("embed"):
+        sentence_embed = await embed(query)
+    tier = tuner.choose((time.perf_counter() - start) * 1000, dim=len(sentence_embed))
+    with timer("index"):
+        candidates = await retrieve(request.app.state.index, query, sentence_embed, tier)
 
     # Stage: Rerank
-    documents = [c.payload["text"] for c in candidates]
-    ranked_idxs = ranker(query=query, candidates=documents, num_results=NUM_RESULTS)
-    ranked_candidates = (candidates[i] for i in ranked_idxs)
-
-    results = []
-    for candidate in ranked_candidates:
-        candidate.payload["start"] = int(candidate.payload["start"])
-        results.append(Result(id=candidate.id, **candidate.payload))
+    with timer("rerank"):
+        rerank_start = time.perf_counter()
+        ranked_idxs, scores = await rerank(query, candidates)
+    if scores is not None:
+        tuner.observe_rerank(len(candidates), (time.perf_counter() - rerank_start) * 1000)
+    ranked_candidates = [candidates[i] for i in threshold(ranked_idxs, scores)]
+
+    with timer("payloads"):
+        display = await request.app.state.index.retrieve(
+            [candidate.id for candidate in ranked_candidates], fields=DISPLAY_FIELDS
+        )
+
+    with timer("serialize"):
+        results = []
+        for candidate in ranked_candidates:
+            # Points deleted by a reindex between the two requests are dropped.
+            if candidate.id not in display:
+                continue
+            payload = {field: display[candidate.id].get(field) for field in DISPLAY_FIELDS}
+            payload["start"] = int(payload["start"])
+            results.append(Result(id=candidate.id, text=candidate.payload["text"], **payload))
+        await result_cache.set(cache_key, [result.model_dump() for result in results])
 
     return results
@@ -0,0 +1,111 @@
+import logging
+import os
+from pathlib import Path
+
+from pydantic import BaseModel
+
+from backend.metrics import Counter, register
+
+# Profile written by scripts/calibrate_search.py. Without one, every request uses SEARCH_HNSW_EF.
+SEARCH_PROFILE = os.getenv("SEARCH_PROFILE")
+SEARCH_HNSW_EF = int(os.getenv("SEARCH_HNSW_EF")) if os.getenv("SEARCH_HNSW_EF") else None
+# End to end latency target for a search. 0 always uses the profile's recommended tier, otherwise each
+# request takes the highest recall tier that fits what is left of the budget after embedding.
+SEARCH_LATENCY_BUDGET_MS = float(os.getenv("SEARCH_LATENCY_BUDGET_MS", "0"))
+# Smoothing of the online estimate of rerank cost per candidate.
+RERANK_COST_SMOOTHING = 0.05
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TIERS = register(
+    Counter("fastsearch_search_tier_total", "Searches by chosen tier.", ("hnsw_ef", "candidates"))
+)
+
+
+class SearchTier(BaseModel):
+    hnsw_ef: int
+    num_candidates: int
+    recall: float = 1.0
+    qdrant_ms: float = 0.0
+
+
+class SearchProfile(BaseModel):
+    """Calibrated search tiers, ordered by increasing recall and cost."""
+
+    collection: str
+    k: int
+    tiers: list[SearchTier]
+    recommended: int
+    rerank_ms_per_candidate: float
+
+    @classmethod
+    def load(cls, path: str | Path) -> "SearchProfile":
+        return cls.model_validate_json(Path(path).read_text())
+
+
+class SearchTuner:
+    """Choose hnsw_ef and the number of candidates for each search.
+
+    Tier cost is the calibrated Qdrant latency plus reranking the tier's candidates, estimated online
+    from recent rerank timings so it tracks load on the inference executor.
+    """
+
+    def __init__(
+        self,
+        num_candidates: int,
+        profile: SearchProfile | None = None,
+        budget_ms: float = SEARCH_LATENCY_BUDGET_MS,
+        hnsw_ef: int | None = SEARCH_HNSW_EF,
+    ) -> None:
+        self.num_candidates = num_candidates
+        self.profile = profile
+        self.budget_ms = budget_ms
+        self.hnsw_ef = hnsw_ef
+        self.rerank_ms_per_candidate = profile.rerank_ms_per_candidate if profile is not None else 0.0
+
+    def choose(self, elapsed_ms: float, dim: int) -> SearchTier:
+        """Tier for a request which has already spent elapsed_ms of its budget."""
+        if self.profile is None:
+            # Uncalibrated default ties ef to the embedding dimension, as before tuning existed.
+            tier = SearchTier(hnsw_ef=self.hnsw_ef or dim, num_candidates=self.num_candidates)
+        elif self.budget_ms <= 0:
+            tier = self.profile.tiers[self.profile.recommended]
+        else:
+            remaining = self.budget_ms - elapsed_ms
+            tier = self.profile.tiers[0]
+            for candidate in self.profile.tiers[1:]:
+                if self.cost(candidate) <= remaining:
+                    tier = candidate
+        SEARCH_TIERS.inc(hnsw_ef=str(tier.hnsw_ef), candidates=str(tier.num_candidates))
+        return tier
+
+    def settings(self) -> dict:
+        """Configuration which decides the tiers searches run with."""
+        return {
+            "profile": self.profile.model_dump(mode="json") if self.profile is not None else None,
+            "budget_ms": self.budget_ms,
+            "hnsw_ef": self.hnsw_ef,
+        }
+
+    def check_collection(self, collection: str) -> None:
+        """Warn when the profile was calibrated on another collection, e.g. before an alias flip."""
+        if self.profile is not None and self.profile.collection != collection:
+            logger.warning(
+                f"Search profile was calibrated on {self.profile.collection} but {collection} is searched, "
+                "recalibrate with scripts/calibrate_search.py."
+            )
+
+    def cost(self, tier: SearchTier) -> float:
+        return tier.qdrant_ms + tier.num_candidates * self.rerank_ms_per_candidate
+
+    def observe_rerank(self, num_candidates: int, elapsed_ms: float) -> None:
+        if num_candidates > 0:
+            per_candidate = elapsed_ms / num_candidates
+            self.rerank_ms_per_candidate += RERANK_COST_SMOOTHING * (
+                per_candidate - self.rerank_ms_per_candidate
+            )
+
+
+def load_tuner(num_candidates: int) -> SearchTuner:
+    profile = SearchProfile.load(SEARCH_PROFILE) if SEARCH_PROFILE else None
+    return SearchTuner(num_candidates, profile)
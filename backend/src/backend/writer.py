@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import os
+
+from sqlalchemy import text
+
+from backend.database import async_engine
+from backend.metrics import Counter, register
+
+WRITER_BATCH_SIZE = int(os.getenv("WRITER_BATCH_SIZE", "500"))
+WRITER_FLUSH_SECONDS = float(os.getenv("WRITER_FLUSH_SECONDS", "1"))
+WRITER_QUEUE_SIZE = int(os.getenv("WRITER_QUEUE_SIZE", "10000"))
+# Disable to run without Postgres (local development, benchmarks). Submitted rows are discarded.
+WRITER_ENABLED = os.getenv("WRITER_ENABLED", "true").lower() == "true"
+
+WRITER_ROWS = register(
+    Counter("fastsearch_writer_rows_total", "Rows handled by buffered writers.", ("writer", "result"))
+)
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedWriter:
+    """Write-behind buffer which inserts rows into table in bulk on a size or time threshold.
+
+    `submit` never blocks. When the bounded queue is full, because Postgres is slow or down, rows are
+    dropped and counted rather than applying backpressure to the request path.
+    """
+
+    def __init__(
+        self,
+        table: str,
+        columns: list[str],
+        batch_size: int = WRITER_BATCH_SIZE,
+        flush_seconds: float = WRITER_FLUSH_SECONDS,
+        queue_size: int = WRITER_QUEUE_SIZE,
+        enabled: bool = WRITER_ENABLED,
+    ) -> None:
+        self.table = table
+        self.columns = columns
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.enabled = enabled
+        self.queue: asyncio.Queue[dict] = asyncio.Queue(maxsize=queue_size)
+        self.closing = False
+        self.task: asyncio.Task | None = None
+        self.dropped = 0
+
+    def submit(self, row: dict) -> bool:
+        return self.submit_many([row])
+
+    def submit_many(self, rows: list[dict]) -> bool:
+        """Queue all rows or, if they don't all fit, none of them."""
+        if not self.enabled:
+            return True
+        if self.queue.maxsize > 0 and self.queue.maxsize - self.queue.qsize() < len(rows):
+            self.dropped += len(rows)
+            WRITER_ROWS.inc(len(rows), writer=self.table, result="dropped")
+            return False
+        for row in rows:
+            self.queue.put_nowait(row)
+        return True
+
+    def start(self) -> None:
+        self.closing = False
+        if self.enabled:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """Flush everything still queued and stop the writer."""
+        self.closing = True
+        if self.task is not None:
+            await self.task
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while not (self.closing and self.queue.empty()):
+            rows = []
+            deadline = loop.time() + self.flush_seconds
+            while len(rows) < self.batch_size and (remaining := deadline - loop.time()) > 0:
+                try:
+                    rows.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except TimeoutError:
+                    break
+            if len(rows) > 0:
+                await self.flush(rows)
+
+    async def flush(self, rows: list[dict]) -> None:
+        try:
+            await self.insert(rows)
+            WRITER_ROWS.inc(len(rows), writer=self.table, result="written")
+        except Exception:
+            logger.exception(f"Dropped {len(rows)} rows for {self.table}.")
+            self.dropped += len(rows)
+            WRITER_ROWS.inc(len(rows), writer=self.table, result="dropped")
+
+    async def insert(self, rows: list[dict]) -> None:
+        """Insert rows with a single multi-row INSERT."""
+        values = ", ".join(
+            "(" + ", ".join(f":{column}_{i}" for column in self.columns) + ")" for i in range(len(rows))
+        )
+        params = {f"{column}_{i}": row[column] for i, row in enumerate(rows) for column in self.columns}
+        statement = text(f"INSERT INTO {self.table} ({', '.join(self.columns)}) VALUES {values};")
+        async with async_engine.begin() as conn:
+            await conn.execute(statement, params)
@@ -0,0 +1,38 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from tokenizers import Tokenizer
+from tokenizers.models import WordPiece
+from tokenizers.normalizers import BertNormalizer
+from tokenizers.pre_tokenizers import BertPreTokenizer
+from tokenizers.processors import TemplateProcessing
+
+SPECIAL_TOKENS = ["[PAD]", "[UNK]", "[CLS]", "[SEP]"]
+
+
+def stand_in_model() -> str:
+    """Model directory with only a BERT style tokenizer, loaded when backend.routes.search is imported."""
+    vocab = {token: i for i, token in enumerate([*SPECIAL_TOKENS, "fast", "ai", "lesson"])}
+    tokenizer = Tokenizer(WordPiece(vocab, unk_token="[UNK]"))
+    tokenizer.normalizer = BertNormalizer(lowercase=True)
+    tokenizer.pre_tokenizer = BertPreTokenizer()
+    tokenizer.post_processor = TemplateProcessing(
+        single="[CLS] $A [SEP]",
+        pair="[CLS] $A [SEP] $B:1 [SEP]:1",
+        special_tokens=[("[CLS]", vocab["[CLS]"]), ("[SEP]", vocab["[SEP]"])],
+    )
+    path = Path(tempfile.mkdtemp(prefix="fastsearch-model-"))
+    tokenizer.save(str(path / "tokenizer.json"))
+    (path / "tokenizer_config.json").write_text(json.dumps({"model_max_length": 64, "pad_token": "[PAD]"}))
+    return str(path)
+
+
+# The backend reads its configuration and loads tokenizers at import time.
+os.environ.setdefault("NUM_CANDIDATES", "30")
+os.environ.setdefault("NUM_RESULTS", "10")
+if "RETRIEVER_MODEL" not in os.environ or "RANKING_MODEL" not in os.environ:
+    model = stand_in_model()
+    os.environ.setdefault("RETRIEVER_MODEL", model)
+    os.environ.setdefault("RANKING_MODEL", model)
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from backend.batching import MicroBatcher
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.batches = []
+
+    def __call__(self, items: list[int]) -> list[int]:
+        self.batches.append(items)
+        return [item * 2 for item in items]
+
+
+def test_flushes_when_batch_is_full():
+    recorder = Recorder()
+    # The timer would never fire within the test, so only the size limit can dispatch.
+    batcher = MicroBatcher("test", recorder, max_batch_size=3, max_wait_ms=60_000)
+
+    async def main() -> list[int]:
+        return await asyncio.wait_for(asyncio.gather(*(batcher.submit(i) for i in range(3))), timeout=5)
+
+    assert asyncio.run(main()) == [0, 2, 4]
+    assert recorder.batches == [[0, 1, 2]]
+
+
+def test_flushes_partial_batch_on_timer():
+    recorder = Recorder()
+    batcher = MicroBatcher("test", recorder, max_batch_size=8, max_wait_ms=1)
+
+    async def main() -> list[int]:
+        return await asyncio.gather(*(batcher.submit(i) for i in range(3)))
+
+    assert asyncio.run(main()) == [0, 2, 4]
+    assert recorder.batches == [[0, 1, 2]]
+
+
+def test_splits_submissions_over_batches():
+    recorder = Recorder()
+    batcher = MicroBatcher("test", recorder, max_batch_size=2, max_wait_ms=1)
+
+    async def main() -> list[int]:
+        return await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+
+    assert asyncio.run(main()) == [0, 2, 4, 6, 8]
+    assert recorder.batches == [[0, 1], [2, 3], [4]]
+
+
+def test_propagates_errors_to_every_submission():
+    def fail(items: list[int]) -> list[int]:
+        raise ValueError("batch failed")
+
+    batcher = MicroBatcher("test", fail, max_batch_size=2, max_wait_ms=1)
+
+    async def main() -> list:
+        return await asyncio.gather(batcher.submit(0), batcher.submit(1), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert len(results) == 2
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_batcher_recovers_after_error():
+    calls = []
+
+    def flaky(items: list[int]) -> list[int]:
+        calls.append(items)
+        if len(calls) == 1:
+            raise ValueError("batch failed")
+        return items
+
+    batcher = MicroBatcher("test", flaky, max_batch_size=1, max_wait_ms=1)
+
+    async def main() -> int:
+        with pytest.raises(ValueError):
+            await batcher.submit(0)
+        return await batcher.submit(1)
+
+    assert asyncio.run(main()) == 1
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from backend import cache
+from backend.cache import LRUCache, MemoryStore, ResultCache, normalize_query
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_normalize_query():
+    assert normalize_query("  What is SGD?? ") == "what is sgd"
+    assert normalize_query("ＦＡＳＴ.ai\tLesson") == "fast ai lesson"
+    assert normalize_query("fine_tune") == "fine_tune"
+
+
+def test_lru_evicts_least_recently_used():
+    lru = LRUCache(capacity=2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == 1
+    lru.set("c", 3)
+    assert lru.get("b") is None
+    assert lru.get("a") == 1
+    assert lru.get("c") == 3
+
+
+def test_lru_expires_entries(clock):
+    lru = LRUCache(capacity=4, ttl=10)
+    lru.set("a", 1)
+    lru.set("b", 2, ttl=30)
+    clock[0] = 9
+    assert lru.get("a") == 1
+    clock[0] = 11
+    assert lru.get("a") is None
+    assert "a" not in lru.entries
+    assert lru.get("b") == 2
+
+
+def test_result_cache_keys():
+    results = ResultCache(namespace="model-a")
+    key = results.key("What is SGD?", "v1")
+    assert key == results.key("what is sgd", "v1")
+    assert key != results.key("what is sgd", "v2")
+    assert key != ResultCache(namespace="model-b").key("what is sgd", "v1")
+
+
+def test_result_cache_fills_local_tier_from_shared_store():
+    async def main() -> None:
+        shared = MemoryStore()
+        writer = ResultCache(namespace="test", shared=shared)
+        reader = ResultCache(namespace="test", shared=shared)
+        key = writer.key("sgd", "v1")
+        await writer.set(key, [{"id": 1}])
+        assert await reader.get(key) == [{"id": 1}]
+        assert reader.local.get(key) == [{"id": 1}]
+
+    asyncio.run(main())
@@ -0,0 +1,50 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+from backend.index import MANIFEST_FILE, PAYLOADS_FILE, VECTORS_FILE, EmbeddedIndex
+
+TEXTS = ["the learning rate", "fine tune a pretrained model", "data augmentation", "learning rate finder"]
+
+
+def export(path, vectors: np.ndarray, payloads: list[dict]) -> None:
+    np.save(path / VECTORS_FILE, vectors.astype(np.float32))
+    (path / PAYLOADS_FILE).write_text(json.dumps(payloads))
+    (path / MANIFEST_FILE).write_text(json.dumps({"version": "test", "count": len(payloads)}))
+
+
+@pytest.fixture
+def index(tmp_path) -> EmbeddedIndex:
+    vectors = np.eye(4)
+    export(
+        tmp_path,
+        vectors,
+        [{"id": 100 + i, "text": text, "title": f"lesson {i}"} for i, text in enumerate(TEXTS)],
+    )
+    return EmbeddedIndex(tmp_path, method="exact")
+
+
+def test_exact_search_returns_nearest_points_best_first(index):
+    points = asyncio.run(index.search([0.1, 0.0, 0.9, 0.3], limit=2, hnsw_ef=16, fields=["title"]))
+    assert [point.id for point in points] == [102, 103]
+    assert points[0].score > points[1].score
+    assert points[0].payload == {"title": "lesson 2"}
+
+
+def test_retrieve_skips_unknown_ids(index):
+    payloads = asyncio.run(index.retrieve([103, 999], fields=["text"]))
+    assert payloads == {103: {"text": "learning rate finder"}}
+
+
+def test_lexical_search_matches_terms(index):
+    points = asyncio.run(index.search_lexical("learning rate", limit=5, fields=["text"]))
+    assert {point.id for point in points} == {100, 103}
+
+
+def test_empty_export(tmp_path):
+    export(tmp_path, np.empty((0, 4)), [])
+    index = EmbeddedIndex(tmp_path, method="exact")
+    assert asyncio.run(index.search([1.0, 0.0, 0.0, 0.0], limit=5, hnsw_ef=16, fields=["text"])) == []
+    assert asyncio.run(index.search_lexical("learning", limit=5, fields=["text"])) == []
@@ -0,0 +1,88 @@
+import base64
+import os
+
+import huggingface_hub.constants
+import numpy as np
+import pytest
+
+from backend.inference import ONNXRanker, output_error, rank, token_model
+
+RANKING_MODEL = os.environ["RANKING_MODEL"]
+
+
+def cached_payload(ids: list[int], model: str) -> dict:
+    token_ids = base64.b64encode(np.asarray(ids, dtype="<i4").tobytes()).decode("ascii")
+    return {"text": "fast ai lesson", "token_ids": token_ids, "token_model": model}
+
+
+def test_token_model_of_local_directory():
+    assert token_model(RANKING_MODEL) == RANKING_MODEL
+
+
+def test_token_model_of_hub_model_carries_the_cached_revision(tmp_path, monkeypatch):
+    repo = tmp_path / "models--fastai--ranker"
+    (repo / "refs").mkdir(parents=True)
+    (repo / "refs" / "main").write_text("0123abcd")
+    (repo / "snapshots" / "0123abcd").mkdir(parents=True)
+    monkeypatch.setattr(huggingface_hub.constants, "HF_HUB_CACHE", str(tmp_path))
+    assert token_model("fastai/ranker") == "fastai/ranker@0123abcd"
+
+
+def test_candidate_uses_cached_token_ids():
+    ranker = ONNXRanker(RANKING_MODEL)
+    candidate = ranker.candidate(cached_payload([4, 5, 6], ranker.token_model))
+    assert candidate.tolist() == [4, 5, 6]
+
+
+def test_candidate_ignores_token_ids_of_another_revision():
+    ranker = ONNXRanker(RANKING_MODEL)
+    assert ranker.candidate(cached_payload([4, 5, 6], f"{RANKING_MODEL}@0123abcd")) == "fast ai lesson"
+    assert ranker.candidate({"text": "fast ai lesson"}) == "fast ai lesson"
+
+
+@pytest.mark.parametrize(
+    "query, text",
+    [
+        ("fast ai", "fast ai lesson"),
+        ("lesson", "an unknown word"),
+        ("fast ai lesson", " ".join(["fast", "lesson", "ai"] * 40)),
+        (" ".join(["lesson", "fast"] * 40), "ai lesson"),
+    ],
+)
+def test_pairs_from_cached_ids_match_the_tokenizer(query, text):
+    ranker = ONNXRanker(RANKING_MODEL)
+    ids = np.array(ranker.tokenizer.encode_ids(text), dtype="<i4")
+    from_text, from_ids = ranker.tokenize(query, [text])[0], ranker.tokenize(query, [ids])[0]
+    for key in ["input_ids", "token_type_ids", "attention_mask"]:
+        assert from_ids[key] == from_text[key]
+    assert len(from_text["input_ids"]) <= ranker.tokenizer.model_max_length
+
+
+def test_output_error_of_embeddings_is_relative_per_row():
+    reference = np.array([[3.0, 4.0], [0.3, 0.4]])
+    assert output_error(reference * 1.01, reference) == pytest.approx(0.01, rel=1e-3)
+    assert output_error(reference + [[0.0, 0.0], [0.05, 0.0]], reference) == pytest.approx(0.1, rel=1e-3)
+
+
+def test_output_error_of_logits_near_zero_is_scaled_to_their_range():
+    reference = np.array([[-4.0], [0.001], [6.0]])
+    outputs = reference + [[0.0], [0.02], [-0.1]]
+    # A per-row ratio would be 20 for the logit near 0.
+    assert output_error(outputs, reference) == pytest.approx(0.01, rel=1e-3)
+    assert output_error(np.array([0.5, 0.001]), np.array([0.0, 0.0])) == pytest.approx(0.5)
+
+
+def test_rank_returns_top_scores_best_first():
+    scores = np.array([0.1, 2.5, -1.0, 3.0, 0.7], dtype=np.float32)
+    ranked, ranked_scores = rank(scores, 3)
+    assert ranked == [3, 1, 4]
+    assert ranked_scores == pytest.approx([3.0, 2.5, 0.7])
+
+
+def test_rank_handles_fewer_scores_than_results():
+    assert rank(np.array([1.0, 2.0]), 5)[0] == [1, 0]
+    assert rank(np.array([], dtype=np.float32), 5) == ([], [])
+
+
+def test_rank_keeps_ties_in_candidate_order():
+    assert rank(np.array([1.0, 2.0, 2.0, 2.0]), 3)[0] == [1, 2, 3]
@@ -0,0 +1,59 @@
+import numpy as np
+from qdrant_client.http import models
+
+from backend.lexical import (
+    BM25_AVG_TERMS,
+    BM25_B,
+    BM25_K1,
+    RRF_K,
+    LexicalIndex,
+    query_vector,
+    reciprocal_rank_fusion,
+    term_index,
+    terms,
+)
+
+
+def point(point_id: int, score: float = 0.0) -> models.ScoredPoint:
+    return models.ScoredPoint(id=point_id, version=0, score=score, payload={"rank": point_id})
+
+
+def test_terms_keep_identifiers_whole():
+    assert terms("How do I fine_tune a ResNet?") == ["how", "do", "i", "fine_tune", "a", "resnet"]
+
+
+def test_query_vector_has_one_unit_weight_per_distinct_term():
+    vector = query_vector("learning rate learning")
+    assert vector.indices == sorted([term_index("learning"), term_index("rate")])
+    assert vector.values == [1.0, 1.0]
+
+
+def test_reciprocal_rank_fusion_rewards_points_in_both_rankings():
+    fused = reciprocal_rank_fusion([[point(1), point(2), point(3)], [point(3), point(4)]], limit=3)
+    assert [p.id for p in fused] == [3, 1, 2]
+    assert fused[0].score == 1 / (RRF_K + 3) + 1 / (RRF_K + 1)
+    assert fused[1].score == 1 / (RRF_K + 1)
+
+
+def test_reciprocal_rank_fusion_keeps_first_payload():
+    first = point(1).model_copy(update={"payload": {"text": "dense"}})
+    second = point(1).model_copy(update={"payload": {"text": "lexical"}})
+    assert reciprocal_rank_fusion([[first], [second]], limit=1)[0].payload == {"text": "dense"}
+
+
+def test_lexical_index_scores_bm25_with_fixed_average_length():
+    index = LexicalIndex(["learning rate", "learning rate finder", "data augmentation"])
+    rows, scores = index.top_k("rate", limit=5)
+
+    idf = np.log(1 + (3 - 2 + 0.5) / (2 + 0.5))
+
+    def weight(length: int) -> float:
+        return (BM25_K1 + 1) / (1 + BM25_K1 * (1 - BM25_B + BM25_B * length / BM25_AVG_TERMS))
+
+    assert rows.tolist() == [0, 1]
+    np.testing.assert_allclose(scores, [weight(2) * idf, weight(3) * idf], rtol=1e-6)
+
+
+def test_lexical_index_without_matches_returns_nothing():
+    rows, scores = LexicalIndex(["learning rate"]).top_k("augmentation", limit=5)
+    assert len(rows) == 0 and len(scores) == 0
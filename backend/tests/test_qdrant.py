@@ -0,0 +1,118 @@
+import asyncio
+
+import grpc
+import pytest
+
+from backend.qdrant import AsyncQdrantPool, QdrantPool, is_connection_error
+
+
+class RpcError(grpc.RpcError):
+    def __init__(self, code: grpc.StatusCode) -> None:
+        self.status = code
+
+    def code(self) -> grpc.StatusCode:
+        return self.status
+
+
+class Client:
+    def __init__(self) -> None:
+        self.closed = False
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class AsyncClient(Client):
+    async def close(self) -> None:
+        self.closed = True
+
+
+def test_is_connection_error():
+    assert is_connection_error(RpcError(grpc.StatusCode.UNAVAILABLE))
+    assert is_connection_error(ConnectionError())
+    assert not is_connection_error(RpcError(grpc.StatusCode.NOT_FOUND))
+    assert not is_connection_error(RpcError(grpc.StatusCode.DEADLINE_EXCEEDED))
+    assert not is_connection_error(ValueError())
+
+
+def test_pool_keeps_client_on_application_error():
+    pool = QdrantPool(size=1, factory=Client)
+    with pytest.raises(RpcError):
+        with pool.client() as client:
+            raise RpcError(grpc.StatusCode.INVALID_ARGUMENT)
+    with pool.client() as same:
+        assert same is client
+    assert not client.closed
+
+
+def test_pool_replaces_broken_client():
+    pool = QdrantPool(size=1, factory=Client)
+    with pytest.raises(RpcError):
+        with pool.client() as client:
+            raise RpcError(grpc.StatusCode.UNAVAILABLE)
+    assert client.closed
+    with pool.client() as replacement:
+        assert replacement is not client
+        assert not replacement.closed
+
+
+def test_pool_never_returns_closed_client_when_reconnect_fails():
+    clients = [Client()]
+
+    def factory() -> Client:
+        if len(clients) == 0:
+            raise ConnectionError()
+        return clients.pop()
+
+    pool = QdrantPool(size=1, factory=factory)
+    with pytest.raises(ConnectionError):
+        with pool.client():
+            raise ConnectionError()
+    with pytest.raises(ConnectionError):
+        with pool.client():
+            pass
+
+    clients.append(Client())
+    with pool.client() as client:
+        assert not client.closed
+
+
+def test_async_pool_replaces_broken_client():
+    async def main() -> None:
+        pool = AsyncQdrantPool(size=1, factory=AsyncClient)
+        with pytest.raises(RpcError):
+            async with pool.client() as client:
+                raise RpcError(grpc.StatusCode.UNAVAILABLE)
+        assert client.closed
+        async with pool.client() as replacement:
+            assert replacement is not client
+
+    asyncio.run(main())
+
+
+def test_async_pool_shares_clients_between_concurrent_calls():
+    async def main() -> None:
+        pool = AsyncQdrantPool(size=2, factory=AsyncClient)
+        async with pool.client() as first, pool.client() as second, pool.client() as third:
+            assert first is not second
+            assert third is first
+
+    asyncio.run(asyncio.wait_for(main(), timeout=1))
+
+
+def test_async_pool_replaces_a_shared_client_once():
+    async def main() -> None:
+        pool = AsyncQdrantPool(size=1, factory=AsyncClient)
+        with pytest.raises(RpcError):
+            async with pool.client() as client:
+                with pytest.raises(RpcError):
+                    async with pool.client():
+                        raise RpcError(grpc.StatusCode.UNAVAILABLE)
+                async with pool.client() as replacement:
+                    assert replacement is not client
+                raise RpcError(grpc.StatusCode.UNAVAILABLE)
+        async with pool.client() as same:
+            assert same is replacement
+            assert not same.closed
+
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+import asyncio
+
+import numpy as np
+import pytest
+from qdrant_client.http import models
+
+from backend.metrics import Counter
+from backend.routes import search
+
+
+class Ranker:
+    """Stand-in for the ranker batcher, scoring each text by a fixed table and recording calls."""
+
+    def __init__(self, scores: dict[str, float]) -> None:
+        self.scores = scores
+        self.calls = []
+
+    async def submit(self, request: tuple[str, list[str]]) -> np.ndarray:
+        query, documents = request
+        self.calls.append(documents)
+        return np.array([self.scores[document] for document in documents], dtype=np.float32)
+
+
+def candidates(retriever_scores: list[float]) -> list[models.ScoredPoint]:
+    return [
+        models.ScoredPoint(id=i, version=0, score=score, payload={"text": f"doc {i}"})
+        for i, score in enumerate(retriever_scores)
+    ]
+
+
+@pytest.fixture
+def rerank(monkeypatch):
+    """Run rerank with ranker scores per candidate, returning its result, the ranker calls and the exit."""
+    monkeypatch.setattr(search, "RERANK_MODE", "cascade")
+    monkeypatch.setattr(search, "RERANK_SKIP_MARGIN", 0.15)
+    monkeypatch.setattr(search, "RERANK_CHUNK_SIZE", 2)
+    monkeypatch.setattr(search, "NUM_RESULTS", 2)
+    monkeypatch.setattr(search, "HYBRID_SEARCH", False)
+
+    def run(retriever_scores: list[float], ranker_scores: list[float]):
+        ranker = Ranker({f"doc {i}": score for i, score in enumerate(ranker_scores)})
+        exits = Counter("rerank_exit", "", ("exit",))
+        monkeypatch.setattr(search, "ranker_batcher", ranker)
+        monkeypatch.setattr(search, "RERANK_EXIT", exits)
+        result = asyncio.run(search.rerank("query", candidates(retriever_scores)))
+        assert len(exits.values) == 1
+        return result, ranker.calls, next(iter(exits.values))[0]
+
+    return run
+
+
+def test_full_mode_scores_every_candidate_at_once(rerank, monkeypatch):
+    monkeypatch.setattr(search, "RERANK_MODE", "full")
+    (ranked, scores), calls, exit = rerank([0.9, 0.5, 0.4], [0.1, 0.3, 0.2])
+    assert (ranked, scores) == ([1, 2], pytest.approx([0.3, 0.2]))
+    assert len(calls) == 1
+    assert exit == "full"
+
+
+def test_cascade_skips_the_ranker_on_a_decisive_margin(rerank):
+    (ranked, scores), calls, exit = rerank([0.9, 0.5, 0.4], [0.1, 0.3, 0.2])
+    assert (ranked, scores) == ([0, 1], None)
+    assert calls == []
+    assert exit == "skip"
+
+
+def test_cascade_skips_the_ranker_for_a_single_candidate(rerank):
+    assert rerank([0.9], [0.1])[0] == ([0], None)
+
+
+def test_cascade_never_skips_on_fused_scores(rerank, monkeypatch):
+    monkeypatch.setattr(search, "HYBRID_SEARCH", True)
+    (ranked, scores), calls, exit = rerank([0.9, 0.5, 0.4], [0.1, 0.3, 0.2])
+    assert (ranked, scores) == ([1, 2], pytest.approx([0.3, 0.2]))
+    assert len(calls) == 2
+    assert exit == "full"
+
+
+def test_cascade_exits_early_once_the_top_results_stop_changing(rerank):
+    (ranked, scores), calls, exit = rerank([0.5, 0.45, 0.4, 0.35, 0.3, 0.25], [5, 4, 1, 0, 9, 9])
+    assert (ranked, scores) == ([0, 1], pytest.approx([5, 4]))
+    assert calls == [["doc 0", "doc 1"], ["doc 2", "doc 3"]]
+    assert exit == "early"
+
+
+def test_cascade_scores_everything_while_the_top_results_keep_changing(rerank):
+    (ranked, scores), calls, exit = rerank([0.5, 0.45, 0.4, 0.35, 0.3], [1, 2, 3, 4, 5])
+    assert (ranked, scores) == ([4, 3], pytest.approx([5, 4]))
+    assert len(calls) == 3
+    assert exit == "full"
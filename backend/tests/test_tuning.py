@@ -0,0 +1,61 @@
+import logging
+
+import pytest
+
+from backend.tuning import SearchProfile, SearchTier, SearchTuner
+
+TIERS = [
+    SearchTier(hnsw_ef=16, num_candidates=10, recall=0.8, qdrant_ms=1.0),
+    SearchTier(hnsw_ef=64, num_candidates=30, recall=0.95, qdrant_ms=2.0),
+    SearchTier(hnsw_ef=256, num_candidates=100, recall=0.99, qdrant_ms=6.0),
+]
+
+
+@pytest.fixture
+def profile() -> SearchProfile:
+    return SearchProfile(
+        collection="fastai-0123abcd", k=10, tiers=TIERS, recommended=1, rerank_ms_per_candidate=0.5
+    )
+
+
+def test_uncalibrated_tier_ties_ef_to_dimension():
+    tier = SearchTuner(num_candidates=30, hnsw_ef=None).choose(elapsed_ms=0, dim=384)
+    assert (tier.hnsw_ef, tier.num_candidates) == (384, 30)
+    assert SearchTuner(num_candidates=30, hnsw_ef=128).choose(elapsed_ms=0, dim=384).hnsw_ef == 128
+
+
+def test_without_budget_uses_recommended_tier(profile):
+    assert SearchTuner(30, profile, budget_ms=0).choose(elapsed_ms=100, dim=384) == TIERS[1]
+
+
+def test_budget_picks_highest_recall_tier_that_fits(profile):
+    # Tier costs are 6ms, 17ms and 56ms with 0.5ms of reranking per candidate.
+    tuner = SearchTuner(30, profile, budget_ms=60)
+    assert tuner.choose(elapsed_ms=0, dim=384) == TIERS[2]
+    assert tuner.choose(elapsed_ms=20, dim=384) == TIERS[1]
+    assert tuner.choose(elapsed_ms=50, dim=384) == TIERS[0]
+    # The cheapest tier is the floor even when the budget is already spent.
+    assert tuner.choose(elapsed_ms=100, dim=384) == TIERS[0]
+
+
+def test_rerank_cost_tracks_observed_timings(profile):
+    tuner = SearchTuner(30, profile, budget_ms=60)
+    for _ in range(200):
+        tuner.observe_rerank(num_candidates=100, elapsed_ms=100)
+    assert tuner.rerank_ms_per_candidate == pytest.approx(1.0, rel=1e-3)
+    assert tuner.choose(elapsed_ms=0, dim=384) == TIERS[1]
+    tuner.observe_rerank(num_candidates=0, elapsed_ms=5)
+    assert tuner.rerank_ms_per_candidate == pytest.approx(1.0, rel=1e-3)
+
+
+def test_warns_when_profile_is_for_another_collection(profile, caplog):
+    tuner = SearchTuner(30, profile)
+    with caplog.at_level(logging.WARNING, logger="backend.tuning"):
+        tuner.check_collection("fastai-0123abcd")
+        assert caplog.records == []
+        tuner.check_collection("fastai-89abcdef")
+    assert "fastai-0123abcd" in caplog.text
+
+
+def test_settings_change_with_profile(profile):
+    assert SearchTuner(30, profile).settings() != SearchTuner(30).settings()
@@ -0,0 +1,88 @@
+import asyncio
+
+from backend.writer import BufferedWriter
+
+
+class RecordingWriter(BufferedWriter):
+    def __init__(self, *args, fail: bool = False, **kwargs) -> None:
+        super().__init__("test", ["value"], *args, **kwargs)
+        self.fail = fail
+        self.batches = []
+
+    async def insert(self, rows: list[dict]) -> None:
+        if self.fail:
+            raise ConnectionError("database is down")
+        self.batches.append([row["value"] for row in rows])
+
+
+def test_drops_rows_when_queue_is_full():
+    async def main() -> None:
+        writer = RecordingWriter(queue_size=2, enabled=True)
+        assert writer.submit({"value": 0})
+        assert writer.submit({"value": 1})
+        assert not writer.submit({"value": 2})
+        assert writer.dropped == 1
+
+    asyncio.run(main())
+
+
+def test_disabled_writer_discards_rows():
+    async def main() -> None:
+        writer = RecordingWriter(queue_size=1, enabled=False)
+        writer.start()
+        assert writer.submit({"value": 0})
+        assert writer.submit({"value": 1})
+        await writer.stop()
+        assert writer.batches == []
+
+    asyncio.run(main())
+
+
+def test_flushes_full_batches_and_the_rest_on_stop():
+    async def main() -> None:
+        writer = RecordingWriter(batch_size=2, flush_seconds=0.05, enabled=True)
+        writer.start()
+        for value in range(5):
+            writer.submit({"value": value})
+        await asyncio.sleep(0.01)
+        assert writer.batches == [[0, 1], [2, 3]]
+        await writer.stop()
+        assert writer.batches == [[0, 1], [2, 3], [4]]
+
+    asyncio.run(main())
+
+
+def test_flushes_on_timer():
+    async def main() -> None:
+        writer = RecordingWriter(batch_size=100, flush_seconds=0.01, enabled=True)
+        writer.start()
+        writer.submit({"value": 0})
+        await asyncio.sleep(0.05)
+        assert writer.batches == [[0]]
+        await writer.stop()
+
+    asyncio.run(main())
+
+
+def test_counts_rows_of_failed_inserts_as_dropped():
+    async def main() -> None:
+        writer = RecordingWriter(batch_size=2, flush_seconds=0.05, fail=True, enabled=True)
+        writer.start()
+        writer.submit({"value": 0})
+        writer.submit({"value": 1})
+        await writer.stop()
+        assert writer.dropped == 2
+
+    asyncio.run(main())
+
+
+def test_queues_all_rows_or_none():
+    async def main() -> None:
+        writer = RecordingWriter(queue_size=3, enabled=True)
+        assert writer.submit_many([{"value": 0}, {"value": 1}])
+        assert not writer.submit_many([{"value": 2}, {"value": 3}])
+        assert writer.queue.qsize() == 2
+        assert writer.dropped == 2
+        assert writer.submit_many([{"value": 4}])
+
+    asyncio.run(main())
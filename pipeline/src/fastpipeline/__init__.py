@@ -15,10 +15,12 @@ from fastpipeline.assets import (
 )
 from fastpipeline.io_managers import (
     ConfigurableJSONFileSystemIOManager,
+    ConfigurablePartitionedPickleFileSystemIOManager,
     ConfigurablePolarsArrowFileSystemIOManager,
     ConfigurablePydanticFileSystemIOManager,
 )
 from fastpipeline.resources import (
+    EmbeddedIndexExport,
     HuggingfFaceModel,
     MockWhispher,
     ModalWhispher,
@@ -26,9 +28,15 @@ from fastpipeline.resources import (
 )
 
 DAGSTER_ENV = os.getenv("DAGSTER_ENV", "local")
+# Export for the backend's embedded index, only deployments serving it set a path.
+EMBEDDED_INDEX_PATH = os.getenv("EMBEDDED_INDEX_PATH") or None
+
+indexing_assets = load_assets_from_modules([indexing], group_name="indexing")
+if EMBEDDED_INDEX_PATH is None:
+    indexing_assets = [asset for asset in indexing_assets if asset.key != indexing.embedded_index.key]
 
 all_assets = [
-    *load_assets_from_modules([indexing], group_name="indexing"),
+    *indexing_assets,
     *load_assets_from_modules([metadata], group_name="metadata"),
     *load_assets_from_modules([scraping], group_name="scraping"),
     *load_assets_from_modules([transcription], group_name="transcription"),
@@ -55,10 +63,14 @@ resources = {
     "polars_io": ConfigurablePolarsArrowFileSystemIOManager(),
     "json_io": ConfigurableJSONFileSystemIOManager(),
     "pydantic_io": ConfigurablePydanticFileSystemIOManager(),
+    "partitioned_io": ConfigurablePartitionedPickleFileSystemIOManager(),
     "embed_config": HuggingfFaceModel(model_id=EnvVar("EMBEDDING_MODEL")),
+    "ranker_config": HuggingfFaceModel(model_id=EnvVar("RANKING_MODEL")),
     "transcription_model": whispher_resource,
     "qdrant": qdrant_resource,
 }
+if EMBEDDED_INDEX_PATH is not None:
+    resources["embedded_index_export"] = EmbeddedIndexExport(path=EMBEDDED_INDEX_PATH)
 
 
 defs = Definitions(
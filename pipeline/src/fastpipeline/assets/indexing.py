@@ -1,14 +1,23 @@
+import base64
+import hashlib
+import json
+import os
+import re
+import time
+import zlib
+from collections import Counter
+from typing import Any
+
 import numpy as np
 import polars as pl
 import torch
-from dagster import AssetExecutionContext, AutoMaterializePolicy, asset
+from dagster import AssetExecutionContext, AutoMaterializePolicy, BackfillPolicy, Failure, asset
 from qdrant_client import models
 from tqdm import tqdm
-from transformers import AutoModel, AutoTokenizer
 
 from fastpipeline.assets.metadata import Metadata
 from fastpipeline.partitions import video_partition_def
-from fastpipeline.resources import HuggingfFaceModel, QdrantDatabase
+from fastpipeline.resources import EmbeddedIndexExport, HuggingfFaceModel, QdrantDatabase
 
 
 def mean_pooling(model_output, attention_mask):
@@ -19,21 +28,40 @@ def mean_pooling(model_output, attention_mask):
     )
 
 
-@asset(partitions_def=video_partition_def, auto_materialize_policy=AutoMaterializePolicy.eager())
+# Partitions embedded per backfill run. A run is one step, so one process loads the model for all of them.
+EMBED_PARTITIONS_PER_RUN = int(os.getenv("EMBED_PARTITIONS_PER_RUN", "32"))
+
+
+def by_partition(context: AssetExecutionContext, value) -> dict:
+    """Partitioned input keyed by partition. Runs over several partitions load a dict, others one value."""
+    return value if len(context.partition_keys) > 1 else {context.partition_key: value}
+
+
+@asset(
+    partitions_def=video_partition_def,
+    auto_materialize_policy=AutoMaterializePolicy.eager(),
+    backfill_policy=BackfillPolicy.multi_run(max_partitions_per_run=EMBED_PARTITIONS_PER_RUN),
+    io_manager_key="partitioned_io",
+)
 def embeddings(
     context: AssetExecutionContext,
-    processed_transcripts: pl.DataFrame,
+    processed_transcripts: Any,
     embed_config: HuggingfFaceModel,
-) -> np.ndarray:
-    """Embeddings for lecture transcript segments."""
+) -> dict[str, np.ndarray]:
+    """Embeddings for lecture transcript segments, keyed by video partition.
 
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    model = AutoModel.from_pretrained(embed_config.model_id).to(device)
-    tokenizer = AutoTokenizer.from_pretrained(embed_config.model_id)
+    Backfills embed up to EMBED_PARTITIONS_PER_RUN partitions in one step, the model loads once per step.
+    """
+    transcripts = by_partition(context, processed_transcripts)
 
-    dataloader = torch.utils.data.DataLoader(
-        processed_transcripts["text"].to_list(), batch_size=32, shuffle=False
-    )
+    start = time.perf_counter()
+    device = embed_config.device
+    model = embed_config.load_model()
+    tokenizer = embed_config.load_tokenizer()
+    load_seconds = time.perf_counter() - start
+
+    texts = [text for table in transcripts.values() for text in table["text"].to_list()]
+    dataloader = torch.utils.data.DataLoader(texts, batch_size=32, shuffle=False)
 
     vectors = []
     with torch.inference_mode():
@@ -50,7 +78,29 @@ def embeddings(
             )
             vectors.append(sent_embeds)
 
-    return np.vstack(vectors)
+    context.add_output_metadata(
+        {
+            "partitions": len(transcripts),
+            "segments": len(texts),
+            "load_seconds": load_seconds,
+            "embed_seconds": time.perf_counter() - start - load_seconds,
+        }
+    )
+    splits = np.cumsum([len(table) for table in transcripts.values()])[:-1]
+    return dict(zip(transcripts.keys(), np.split(np.vstack(vectors), splits)))
+
+
+def point_id(video_id: str, segment_id: int) -> int:
+    """Deterministic point id of a segment, shared by the dense and lexical collections.
+
+    48 bits of a sha256 so ids stay exact as JSON numbers in the frontend.
+    """
+    return int(hashlib.sha256(f"{video_id}:{segment_id}".encode("utf8")).hexdigest()[:12], 16)
+
+
+def encode_token_ids(token_ids: list[int]) -> str:
+    """Pack token ids as base64 encoded little-endian int32 for compact storage in qdrant payloads."""
+    return base64.b64encode(np.asarray(token_ids, dtype="<i4").tobytes()).decode("ascii")
 
 
 @asset(
@@ -64,20 +114,28 @@ def payloads(
     lessons: pl.DataFrame,
     courses: pl.DataFrame,
     processed_transcripts: pl.DataFrame,
+    ranker_config: HuggingfFaceModel,
 ) -> pl.DataFrame:
     """JSON payloads for fastsearch search results."""
+    # Pre-tokenize segments for the ranker so the backend can skip candidate tokenization at query time.
+    tokenizer = ranker_config.load_tokenizer()
+    texts = processed_transcripts["text"].to_list()
+    token_ids = tokenizer(texts, add_special_tokens=False, truncation=True)["input_ids"]
+
     payload = (
         processed_transcripts.with_columns(
             [
                 pl.lit(metadata.title).alias("title"),
                 pl.lit(metadata.thumbnail).alias("thumbnail"),
+                pl.Series("token_ids", [encode_token_ids(ids) for ids in token_ids], dtype=pl.String),
+                pl.lit(ranker_config.token_model()).alias("token_model"),
             ]
         )
         .join(lessons, on="video_id", how="left")
         .join(courses, on="course_id", how="left")
         .select(
             [
-                pl.col(["video_id", "text", "start", "thumbnail"]),
+                pl.col(["video_id", "segment_id", "text", "start", "thumbnail", "token_ids", "token_model"]),
                 pl.when(pl.col("name").is_not_null())
                 .then(pl.col("name"))
                 .otherwise(pl.col("title"))
@@ -91,30 +149,323 @@ def payloads(
     return payload
 
 
+def content_hash(payload: dict, *extra: str) -> str:
+    """Hash of a point's payload (and anything else its vector derives from) to detect changed segments."""
+    content = json.dumps(payload, sort_keys=True, default=str) + "\x00".join(extra)
+    return hashlib.sha256(content.encode("utf8")).hexdigest()
+
+
+def ensure_video_id_index(client, collection: str) -> None:
+    """Keyword index on video_id, so a partition's points can be found without a full scan."""
+    if "video_id" not in client.get_collection(collection).payload_schema:
+        client.create_payload_index(collection, "video_id", field_schema=models.PayloadSchemaType.KEYWORD)
+
+
+def existing_hashes(client, collection: str, video_id: str) -> dict[int, str | None]:
+    """Content hash of every point currently indexed for video_id."""
+    hashes, offset = {}, None
+    video_filter = models.Filter(
+        must=[models.FieldCondition(key="video_id", match=models.MatchValue(value=video_id))]
+    )
+    while True:
+        points, offset = client.scroll(
+            collection_name=collection,
+            scroll_filter=video_filter,
+            with_payload=["content_hash"],
+            with_vectors=False,
+            limit=1024,
+            offset=offset,
+        )
+        hashes.update({point.id: point.payload.get("content_hash") for point in points})
+        if offset is None:
+            return hashes
+
+
+def sync_partition(
+    context: AssetExecutionContext, client, collection: str, video_id: str, points: list[models.PointStruct]
+) -> bool:
+    """Upsert the points whose content hash changed and delete the partition's points that no longer exist.
+
+    Returns whether the collection changed.
+    """
+    existing = existing_hashes(client, collection, video_id)
+    changed = [point for point in points if existing.get(point.id) != point.payload["content_hash"]]
+    stale = list(existing.keys() - {point.id for point in points})
+
+    for start in range(0, len(changed), 512):
+        client.upsert(collection_name=collection, points=changed[start : start + 512])
+    if len(stale) > 0:
+        client.delete(collection_name=collection, points_selector=models.PointIdsList(points=stale))
+
+    context.log.info(
+        f"{collection}: upserted {len(changed)}, deleted {len(stale)}, unchanged {len(points) - len(changed)}"
+    )
+    context.add_output_metadata(
+        {"upserted": len(changed), "deleted": len(stale), "unchanged": len(points) - len(changed)}
+    )
+    return len(changed) > 0 or len(stale) > 0
+
+
+def alias_target(client, alias: str) -> str | None:
+    """Collection an alias currently points at."""
+    for collection_alias in client.get_aliases().aliases:
+        if collection_alias.alias_name == alias:
+            return collection_alias.collection_name
+    return None
+
+
+def bump_version(client, qdrant: QdrantDatabase, version: str) -> None:
+    """Bump index version so backend result caches stop serving results from the previous index."""
+    if not client.collection_exists(qdrant.version_collection):
+        client.create_collection(
+            collection_name=qdrant.version_collection,
+            vectors_config=models.VectorParams(size=1, distance=models.Distance.DOT),
+        )
+    client.upsert(
+        collection_name=qdrant.version_collection,
+        points=[models.PointStruct(id=0, vector=[1.0], payload={"version": version})],
+    )
+
+
 @asset(partitions_def=video_partition_def, auto_materialize_policy=AutoMaterializePolicy.eager())
 def vector_index(
     context: AssetExecutionContext,
     embeddings: np.ndarray,
     payloads: pl.DataFrame,
     qdrant: QdrantDatabase,
+    embed_config: HuggingfFaceModel,
 ) -> None:
-    """Vector index (qdrant) of fast.ai lecture transcript segments."""
+    """Vector index (qdrant) of fast.ai lecture transcript segments.
+
+    Vectors are written to the collection of the embedding model's revision. When the weights change, a
+    backfill fills a fresh collection while the backend keeps searching the old one through the alias,
+    until collection_alias flips it. Point ids are derived from (video_id, segment_id) so re-materializing
+    a partition only rewrites the segments whose content changed and removes the ones which disappeared.
+    """
     client = qdrant.create_client()
+    collection = qdrant.versioned_collection(embed_config.revision())
 
-    existing_collections = [collection.name for collection in client.get_collections().collections]
-    if qdrant.collection not in existing_collections:
-        context.log.error("COLLECTION DOESN'T EXISIT")
-        client.recreate_collection(
-            collection_name=qdrant.collection,
+    if not client.collection_exists(collection):
+        # Bulk load without building the HNSW graph, collection_alias enables indexing once loaded.
+        client.create_collection(
+            collection_name=collection,
             vectors_config=models.VectorParams(size=embeddings.shape[-1], distance=models.Distance.COSINE),
+            optimizers_config=models.OptimizersConfigDiff(indexing_threshold=0),
             on_disk_payload=True,
         )
-        context.log.info("Created Collection")
-
-    context.log.info("Uploading Collection")
-    client.upload_collection(
-        collection_name=qdrant.collection,
-        vectors=embeddings,
-        payload=payloads.to_dicts(),
-        batch_size=min(512, len(payloads)),
+        context.log.info(f"Created {collection}")
+    ensure_video_id_index(client, collection)
+
+    points = [
+        models.PointStruct(
+            id=point_id(row["video_id"], row["segment_id"]),
+            vector=vector.tolist(),
+            payload={**row, "content_hash": content_hash(row, embed_config.model_id)},
+        )
+        for row, vector in zip(payloads.iter_rows(named=True), embeddings)
+    ]
+    changed = sync_partition(context, client, collection, context.partition_key, points)
+
+    # Incremental updates to the live collection, e.g. a new video, are searchable right away.
+    if changed and alias_target(client, qdrant.collection) == collection:
+        bump_version(client, qdrant, context.run_id)
+
+
+# Indexing threshold (KB of vectors) restored once a bulk loaded collection is complete, Qdrant's default.
+INDEXING_THRESHOLD = 20000
+INDEXING_TIMEOUT_SECONDS = 3600
+INDEXING_POLL_SECONDS = 10
+ALIAS_RETRIES = 5
+
+
+def update_aliases(client, operations: list) -> None:
+    """Apply alias operations, retrying so a transient error can't leave the alias missing mid-migration."""
+    for attempt in range(ALIAS_RETRIES):
+        try:
+            client.update_collection_aliases(change_aliases_operations=operations)
+            return
+        except Exception:
+            if attempt == ALIAS_RETRIES - 1:
+                raise
+            time.sleep(2**attempt)
+
+
+def missing_partitions(context: AssetExecutionContext) -> set[str]:
+    """Video partitions vector_index has never materialized, i.e. a backfill that is still running."""
+    partitions = video_partition_def.get_partition_keys(dynamic_partitions_store=context.instance)
+    return set(partitions) - context.instance.get_materialized_partitions(vector_index.key)
+
+
+@asset(deps=[vector_index], auto_materialize_policy=AutoMaterializePolicy.eager())
+def collection_alias(
+    context: AssetExecutionContext,
+    payloads: dict[str, pl.DataFrame],
+    qdrant: QdrantDatabase,
+    embed_config: HuggingfFaceModel,
+) -> None:
+    """Point the backend's alias at the embedding model's collection once it holds every segment.
+
+    Eagerly materialized after every vector_index partition, so during a backfill it skips until the
+    collection is complete. Then enables HNSW indexing of the bulk loaded collection, waits for the optimizer
+    to finish and swaps the alias in a single atomic operation. The previous collection is kept for
+    rollback, older ones dropped.
+    """
+    client = qdrant.create_client()
+    collection = qdrant.versioned_collection(embed_config.revision())
+    previous = alias_target(client, qdrant.collection)
+    if previous == collection:
+        context.log.info(f"{qdrant.collection} already points at {collection}")
+        return
+
+    missing = missing_partitions(context)
+    if len(missing) > 0:
+        context.log.info(f"Backfill of {collection} has {len(missing)} partitions left, keeping {previous}")
+        context.add_output_metadata({"collection": collection, "missing_partitions": len(missing)})
+        return
+    # Partitions materialized for an earlier revision count above, the collection itself must be complete.
+    expected = sum(len(table) for table in payloads.values())
+    count = client.count(collection, exact=True).count
+    if count != expected:
+        context.log.info(f"{collection} holds {count} of {expected} segments, keeping {previous}")
+        context.add_output_metadata({"collection": collection, "points": count, "expected": expected})
+        return
+
+    client.update_collection(
+        collection, optimizers_config=models.OptimizersConfigDiff(indexing_threshold=INDEXING_THRESHOLD)
     )
+    deadline = time.monotonic() + INDEXING_TIMEOUT_SECONDS
+    while client.get_collection(collection).status != models.CollectionStatus.GREEN:
+        if time.monotonic() > deadline:
+            raise Failure(f"{collection} was not indexed within {INDEXING_TIMEOUT_SECONDS}s")
+        time.sleep(INDEXING_POLL_SECONDS)
+
+    if previous is None and client.collection_exists(qdrant.collection):
+        # Collections written before aliases use the alias name itself. Qdrant can neither rename a collection
+        # nor alias over one, so the legacy collection is swapped out in the fewest steps: everything which
+        # can fail (indexing, alias updates) happens while it still serves, under a temporary alias, and only
+        # the delete and a single aliases call separate it from the new collection.
+        migrating = f"{qdrant.collection}_migrating"
+        update_aliases(
+            client,
+            [
+                models.CreateAliasOperation(
+                    create_alias=models.CreateAlias(collection_name=collection, alias_name=migrating)
+                )
+            ],
+        )
+        context.log.warning(f"Replacing unversioned collection {qdrant.collection} with alias")
+        client.delete_collection(qdrant.collection)
+        operations = [
+            models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=migrating)),
+            models.CreateAliasOperation(
+                create_alias=models.CreateAlias(collection_name=collection, alias_name=qdrant.collection)
+            ),
+        ]
+    else:
+        operations = [
+            models.CreateAliasOperation(
+                create_alias=models.CreateAlias(collection_name=collection, alias_name=qdrant.collection)
+            )
+        ]
+        if previous is not None:
+            operations.insert(
+                0, models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=qdrant.collection))
+            )
+    update_aliases(client, operations)
+    bump_version(client, qdrant, context.run_id)
+    context.log.info(f"Flipped {qdrant.collection} from {previous} to {collection}")
+
+    for stale in client.get_collections().collections:
+        if stale.name.startswith(f"{qdrant.collection}-") and stale.name not in (collection, previous):
+            client.delete_collection(stale.name)
+            context.log.info(f"Deleted {stale.name}")
+    context.add_output_metadata({"collection": collection, "previous": previous or "", "points": count})
+
+
+# Term hashing and BM25 weighting, must match backend.lexical.
+LEXICAL_VECTOR = "lexical"
+TERM = re.compile(r"\w+")
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Average terms per ~30s merged segment. Fixed so each partition can be weighted independently.
+BM25_AVG_TERMS = 80
+
+
+def sparse_vector(text: str) -> models.SparseVector:
+    """BM25 term frequency weights of text. Qdrant applies IDF at query time (Modifier.IDF)."""
+    counts = Counter(zlib.crc32(term.encode("utf8")) for term in TERM.findall(text.lower()))
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * sum(counts.values()) / BM25_AVG_TERMS)
+    indices = sorted(counts)
+    return models.SparseVector(
+        indices=indices, values=[counts[i] * (BM25_K1 + 1) / (counts[i] + norm) for i in indices]
+    )
+
+
+@asset(partitions_def=video_partition_def, auto_materialize_policy=AutoMaterializePolicy.eager())
+def lexical_index(
+    context: AssetExecutionContext,
+    payloads: pl.DataFrame,
+    qdrant: QdrantDatabase,
+) -> None:
+    """Sparse BM25 index (qdrant) of fast.ai lecture transcript segments, for hybrid retrieval."""
+    client = qdrant.create_client()
+    if not client.collection_exists(qdrant.lexical_collection):
+        client.create_collection(
+            collection_name=qdrant.lexical_collection,
+            vectors_config={},
+            sparse_vectors_config={LEXICAL_VECTOR: models.SparseVectorParams(modifier=models.Modifier.IDF)},
+        )
+    ensure_video_id_index(client, qdrant.lexical_collection)
+
+    # Carries the reranker's fields so lexical candidates are reranked without another lookup.
+    points = []
+    for row in payloads.iter_rows(named=True):
+        payload = {key: row[key] for key in ["video_id", "text", "token_ids", "token_model"]}
+        payload["content_hash"] = content_hash(payload, str(BM25_AVG_TERMS))
+        points.append(
+            models.PointStruct(
+                id=point_id(row["video_id"], row["segment_id"]),
+                vector={LEXICAL_VECTOR: sparse_vector(row["text"])},
+                payload=payload,
+            )
+        )
+    sync_partition(context, client, qdrant.lexical_collection, context.partition_key, points)
+
+
+@asset(deps=[collection_alias])
+def embedded_index(
+    context: AssetExecutionContext,
+    embeddings: dict[str, np.ndarray],
+    payloads: dict[str, pl.DataFrame],
+    qdrant: QdrantDatabase,
+    embed_config: HuggingfFaceModel,
+    embedded_index_export: EmbeddedIndexExport,
+) -> None:
+    """Unit normalized embedding matrix and id aligned payload table for the backend's in-process index.
+
+    Layout matches backend.index: vectors.npy, payloads.json (rows with their point id) and manifest.json.
+    Only registered when EMBEDDED_INDEX_PATH is set and materialized on demand, since it loads every
+    partition. Like collection_alias it only exports once every segment is embedded by the current
+    revision, i.e. the alias points at its collection, so the matrix never mixes vectors of two models.
+    """
+    revision = embed_config.revision()
+    collection = qdrant.versioned_collection(revision)
+    live = alias_target(qdrant.create_client(), qdrant.collection)
+    if live != collection:
+        raise Failure(f"{qdrant.collection} points at {live}, not {collection}, backfill and flip it first")
+
+    video_ids = sorted(embeddings.keys() & payloads.keys())
+    vectors = np.vstack([embeddings[video_id] for video_id in video_ids]).astype(np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=-1, keepdims=True), 1e-9)
+    table = pl.concat([payloads[video_id] for video_id in video_ids], how="diagonal_relaxed").to_dicts()
+    rows = [{"id": point_id(payload["video_id"], payload["segment_id"]), **payload} for payload in table]
+
+    path = embedded_index_export.upath
+    path.mkdir(parents=True, exist_ok=True)
+    with (path / "vectors.npy").open("wb") as file:
+        np.save(file, vectors.astype(embedded_index_export.dtype))
+    with (path / "payloads.json").open("w") as file:
+        json.dump(rows, file)
+    with (path / "manifest.json").open("w") as file:
+        json.dump({"version": context.run_id, "count": len(rows), "revision": revision}, file)
+    context.log.info(f"Exported {len(rows)} segments from {len(video_ids)} videos to {path}")
@@ -121,7 +121,9 @@ def processed_transcripts(context: AssetExecutionContext, raw_transcripts: pl.Da
     video_id = context.partition_key
     segments = raw_transcripts.sort(by=pl.col("end")).to_dicts()
     if len(segments) <= 1:
-        return raw_transcripts.select(["id", "start", "end", "text", "video_id", "kind"])
+        return raw_transcripts.select(["id", "start", "end", "text", "video_id", "kind"]).rename(
+            {"id": "segment_id"}
+        )
 
     max_duration = 30
     duration = 0
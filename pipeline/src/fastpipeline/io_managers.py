@@ -1,6 +1,7 @@
 import json
+import pickle
 import typing
-from typing import Optional
+from typing import Any, Optional
 
 import polars as pl
 from dagster import (
@@ -105,3 +106,41 @@ class ConfigurablePydanticFileSystemIOManager(ConfigurableIOManagerFactory):
     def create_io_manager(self, context: InitResourceContext) -> IOManager:
         base_dir = self.base_dir or check.not_none(context.instance).storage_directory()
         return PydanticFileSystemIOManager(base_dir)
+
+
+class PartitionedPickleFileSystemIOManager(UPathIOManager):
+    """Pickled outputs at the paths of dagster's default io_manager, for assets materializing several
+    partitions in one step. Partitioned outputs are dicts of partition key to value, stored one file per
+    partition, so downstream assets still load single partitions.
+    """
+
+    extension: str = ""
+
+    def __init__(self, base_dir=None, **kwargs):
+        from upath import UPath
+
+        self.base_dir = check.opt_str_param(base_dir, "base_dir")
+        super().__init__(base_path=UPath(base_dir, **kwargs))
+
+    def handle_output(self, context: OutputContext, obj: dict[str, Any]):
+        if not context.has_asset_partitions:
+            return super().handle_output(context, obj)
+        for partition_key, path in self._get_paths_for_partitions(context).items():
+            self.make_directory(path.parent)
+            self.dump_to_path(context, obj[partition_key], path)
+
+    def dump_to_path(self, context: OutputContext, obj: Any, path: UPath):
+        with path.open("wb") as file:
+            pickle.dump(obj, file, pickle.HIGHEST_PROTOCOL)
+
+    def load_from_path(self, context: InputContext, path: UPath) -> Any:
+        with path.open("rb") as file:
+            return pickle.load(file)
+
+
+class ConfigurablePartitionedPickleFileSystemIOManager(ConfigurableIOManagerFactory):
+    base_dir: Optional[str]
+
+    def create_io_manager(self, context: InitResourceContext) -> IOManager:
+        base_dir = self.base_dir or check.not_none(context.instance).storage_directory()
+        return PartitionedPickleFileSystemIOManager(base_dir)
@@ -1,25 +1,113 @@
+import functools
+import hashlib
+import os
 from typing import Optional
 
+import torch
 from dagster import ConfigurableResource
+from huggingface_hub import model_info
 from qdrant_client import QdrantClient
+from transformers import AutoModel, AutoTokenizer
 from upath import UPath
 
 import modal
 
 
+@functools.cache
+def load_model(
+    model_id: str, revision: Optional[str], device: str, attn_implementation: Optional[str], compile: bool
+):
+    kwargs = {"attn_implementation": attn_implementation} if attn_implementation is not None else {}
+    model = AutoModel.from_pretrained(model_id, revision=revision, **kwargs).to(device).eval()
+    # Padded batch lengths vary, dynamic shapes avoid recompiling for each one.
+    return torch.compile(model, dynamic=True) if compile else model
+
+
+@functools.cache
+def load_tokenizer(model_id: str, revision: Optional[str]):
+    return AutoTokenizer.from_pretrained(model_id, revision=revision)
+
+
+@functools.cache
+def model_revision(model_id: str) -> str:
+    """Resolved once per process, the hub lookup would otherwise run on every partition and model load."""
+    if os.path.isdir(model_id):
+        return hashlib.sha256(os.path.abspath(model_id).encode("utf8")).hexdigest()
+    return model_info(model_id).sha
+
+
 class HuggingfFaceModel(ConfigurableResource):
+    """Hugging Face model, loaded once per process and shared by every step run in it."""
+
     model_id: str
+    # Intra-op threads for CPU inference, torch's default (one per core) when unset.
+    num_threads: Optional[int] = None
+    # "sdpa" runs attention through torch's fused scaled_dot_product_attention, superseding BetterTransformer.
+    attn_implementation: Optional[str] = None
+    compile: bool = False
+
+    def revision(self) -> str:
+        """Commit sha of the model weights on the hub, or a hash of the path for a local model."""
+        return model_revision(self.model_id)
+
+    def token_model(self) -> str:
+        """model_id@revision recorded with cached token ids, the backend ignores ids from another revision."""
+        return self.model_id if os.path.isdir(self.model_id) else f"{self.model_id}@{self.revision()}"
+
+    def hub_revision(self) -> Optional[str]:
+        # Pinned so the loaded weights match the versioned collection they are written to.
+        return None if os.path.isdir(self.model_id) else self.revision()
+
+    @property
+    def device(self) -> torch.device:
+        return torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+    def load_model(self):
+        if self.num_threads is not None:
+            torch.set_num_threads(self.num_threads)
+        return load_model(
+            self.model_id, self.hub_revision(), str(self.device), self.attn_implementation, self.compile
+        )
+
+    def load_tokenizer(self):
+        return load_tokenizer(self.model_id, self.hub_revision())
 
 
 class QdrantDatabase(ConfigurableResource):
     host: str
     key: str
+    # Alias the backend searches, pointed at the versioned collection of the current embedding model.
     collection: str
 
+    def versioned_collection(self, revision: str) -> str:
+        """Collection holding the vectors of one embedding model revision."""
+        return f"{self.collection}-{revision[:8]}"
+
+    @property
+    def version_collection(self) -> str:
+        """Single point collection holding the index version the backend keys its result cache on."""
+        return f"{self.collection}_version"
+
+    @property
+    def lexical_collection(self) -> str:
+        """Sparse BM25 term vectors of the segments in collection, under the same point ids."""
+        return f"{self.collection}_lexical"
+
     def create_client(self, grpc: bool = True, https: bool = True, *args, **kwargs):
         return QdrantClient(*args, host=self.host, api_key=self.key, prefer_grpc=grpc, https=https, **kwargs)
 
 
+class EmbeddedIndexExport(ConfigurableResource):
+    """Local or s3 location of the vectors and payloads served by the backend's embedded index."""
+
+    path: str
+    dtype: str = "float32"
+
+    @property
+    def upath(self) -> UPath:
+        return UPath(self.path)
+
+
 class ModalWhispher(ConfigurableResource):
     app_name: Optional[str] = "fastsearch"
     tag: Optional[str] = "transcribe"
@@ -0,0 +1,68 @@
+import pickle
+
+import numpy as np
+import polars as pl
+import pytest
+from dagster import DagsterInstance, asset, materialize
+from transformers import BertConfig, BertModel, BertTokenizerFast
+
+from fastpipeline.assets.indexing import embeddings
+from fastpipeline.io_managers import ConfigurablePartitionedPickleFileSystemIOManager
+from fastpipeline.partitions import video_partition_def
+from fastpipeline.resources import HuggingfFaceModel, load_model
+
+WORDS = ["fast", "ai", "lesson", "learning", "rate"]
+VIDEOS = {"abc": ["fast ai lesson", "learning rate"], "def": ["fast ai"], "xyz": ["lesson", "rate", "ai"]}
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    """Tiny randomly initialized BERT, a local stand-in for the embedding model."""
+    (tmp_path / "vocab.txt").write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", *WORDS]))
+    BertTokenizerFast(str(tmp_path / "vocab.txt")).save_pretrained(tmp_path)
+    config = BertConfig(
+        vocab_size=5 + len(WORDS),
+        hidden_size=8,
+        num_hidden_layers=1,
+        num_attention_heads=2,
+        intermediate_size=16,
+    )
+    BertModel(config).save_pretrained(tmp_path)
+    return str(tmp_path)
+
+
+@asset(partitions_def=video_partition_def, io_manager_key="partitioned_io", key="processed_transcripts")
+def transcripts(context) -> dict[str, pl.DataFrame]:
+    return {video_id: pl.DataFrame({"text": VIDEOS[video_id]}) for video_id in context.partition_keys}
+
+
+def test_embeddings_embed_a_partition_range_in_one_step(model_dir, tmp_path):
+    load_model.cache_clear()
+    resources = {
+        "partitioned_io": ConfigurablePartitionedPickleFileSystemIOManager(
+            base_dir=str(tmp_path / "storage")
+        ),
+        "embed_config": HuggingfFaceModel(model_id=model_dir),
+    }
+    tags = {"dagster/asset_partition_range_start": "abc", "dagster/asset_partition_range_end": "xyz"}
+    with DagsterInstance.ephemeral() as instance:
+        instance.add_dynamic_partitions(video_partition_def.name, list(VIDEOS))
+        result = materialize([transcripts, embeddings], instance=instance, resources=resources, tags=tags)
+        assert result.success
+
+        materializations = result.asset_materializations_for_node("embeddings")
+        assert sorted(m.partition for m in materializations) == sorted(VIDEOS)
+        assert materializations[0].metadata["partitions"].value == 3
+        assert materializations[0].metadata["segments"].value == 6
+
+        # New videos are still embedded one partition at a time, reusing the loaded model.
+        assert materialize(
+            [transcripts, embeddings], instance=instance, resources=resources, partition_key="def"
+        )
+    assert load_model.cache_info().misses == 1
+
+    for video_id, texts in VIDEOS.items():
+        with (tmp_path / "storage" / "embeddings" / video_id).open("rb") as file:
+            vectors = pickle.load(file)
+        assert isinstance(vectors, np.ndarray)
+        assert vectors.shape == (len(texts), 8)
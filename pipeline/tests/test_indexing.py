@@ -0,0 +1,88 @@
+import logging
+
+import pytest
+from dagster import AssetMaterialization, DagsterInstance, build_asset_context
+from qdrant_client import QdrantClient, models
+
+from fastpipeline.assets.indexing import content_hash, missing_partitions, point_id, sync_partition
+from fastpipeline.partitions import video_partition_def
+
+
+def test_point_id_is_stable_across_runs():
+    assert point_id("abc", 1) == 210895973957277
+
+
+def test_point_id_fits_in_48_bits():
+    ids = {point_id(video_id, segment_id) for video_id in ("abc", "xyz") for segment_id in range(100)}
+    assert len(ids) == 200
+    assert all(0 <= i < 2**48 for i in ids)
+
+
+class Context:
+    """Stand-in for the asset context, recording what sync_partition reports."""
+
+    def __init__(self) -> None:
+        self.log = logging.getLogger("test")
+        self.metadata = {}
+
+    def add_output_metadata(self, metadata: dict) -> None:
+        self.metadata.update(metadata)
+
+
+def segment(video_id: str, segment_id: int, text: str) -> models.PointStruct:
+    payload = {"video_id": video_id, "segment_id": segment_id, "text": text}
+    return models.PointStruct(
+        id=point_id(video_id, segment_id),
+        vector=[1.0, float(segment_id)],
+        payload={**payload, "content_hash": content_hash(payload)},
+    )
+
+
+@pytest.fixture
+def client() -> QdrantClient:
+    client = QdrantClient(":memory:")
+    client.create_collection(
+        "segments", vectors_config=models.VectorParams(size=2, distance=models.Distance.DOT)
+    )
+    return client
+
+
+def test_content_hash_changes_with_payload_and_extras():
+    payload = {"text": "learning rate", "start": 1.0}
+    assert content_hash(payload) == content_hash(dict(reversed(payload.items())))
+    assert content_hash(payload) != content_hash({**payload, "text": "learning rates"})
+    assert content_hash(payload) != content_hash(payload, "model@abc")
+
+
+def test_sync_partition_upserts_only_changed_points_and_deletes_stale(client):
+    context = Context()
+    first = [segment("abc", i, f"text {i}") for i in range(3)]
+    other = [segment("xyz", 0, "other video")]
+    assert sync_partition(context, client, "segments", "abc", first)
+    assert sync_partition(context, client, "segments", "xyz", other)
+
+    second = [first[0], segment("abc", 1, "edited"), segment("abc", 3, "new")]
+    assert sync_partition(context, client, "segments", "abc", second)
+    assert context.metadata == {"upserted": 2, "deleted": 1, "unchanged": 1}
+
+    indexed = {point.id: point.payload["text"] for point in client.scroll("segments", limit=10)[0]}
+    assert indexed == {point.id: point.payload["text"] for point in second + other}
+
+
+def test_sync_partition_unchanged_partition_is_a_no_op(client):
+    context = Context()
+    points = [segment("abc", i, f"text {i}") for i in range(3)]
+    sync_partition(context, client, "segments", "abc", points)
+
+    assert not sync_partition(context, client, "segments", "abc", points)
+    assert context.metadata == {"upserted": 0, "deleted": 0, "unchanged": 3}
+
+
+def test_missing_partitions_lists_videos_vector_index_has_not_materialized():
+    with DagsterInstance.ephemeral() as instance:
+        instance.add_dynamic_partitions(video_partition_def.name, ["abc", "xyz"])
+        instance.report_runless_asset_event(AssetMaterialization(asset_key="vector_index", partition="abc"))
+        assert missing_partitions(build_asset_context(instance=instance)) == {"xyz"}
+
+        instance.report_runless_asset_event(AssetMaterialization(asset_key="vector_index", partition="xyz"))
+        assert missing_partitions(build_asset_context(instance=instance)) == set()
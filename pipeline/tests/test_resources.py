@@ -0,0 +1,10 @@
+from fastpipeline.resources import HuggingfFaceModel, model_revision
+
+
+def test_revision_is_resolved_once_per_model(tmp_path):
+    model = HuggingfFaceModel(model_id=str(tmp_path))
+    model_revision.cache_clear()
+
+    assert model.revision() == model.revision()
+    assert model.hub_revision() is None
+    assert model_revision.cache_info().misses == 1